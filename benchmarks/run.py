@@ -0,0 +1,256 @@
+"""Benchmarks of the calculation and lookup hot paths.
+
+Modules of the integration are imported without its __init__, so only
+price_now needs Home Assistant to be installed and is skipped otherwise.
+
+    python benchmarks/run.py [--quick] [--filter NAME] [--save-baseline]
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_DIR = os.path.join(ROOT, "custom_components", "price_calc")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+RESOLUTIONS = [1, 60, 3600]
+HORIZONS = [24, 48, 72]
+ENTRIES = [1, 10, 100]
+QUICK_ENTRIES = [1, 10]
+REPEAT = 5
+QUICK_REPEAT = 2
+# calls of price_now timed together
+LOOKUPS = 1000
+# cases this much slower than the baseline are reported as regressions
+DEFAULT_THRESHOLD = 1.5
+# differences below this are timing noise
+NOISE_SECONDS = 0.001
+
+
+def import_module(name: str):
+    """Import module of the integration without running the package __init__."""
+    if "price_calc" not in sys.modules:
+        package = types.ModuleType("price_calc")
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules["price_calc"] = package
+    return importlib.import_module(f"price_calc.{name}")
+
+
+def measure(function, repeat: int) -> dict:
+    """Return best and median seconds of repeat calls and peak traced memory of one call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "peak_bytes": peak,
+    }
+
+
+def calculation_cases(data_dir: str, entries: list[int]):
+    """Yield name and function of every calculation case."""
+    price_calc = import_module("price_calc")
+    models = import_module("models")
+
+    start_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for resolution in RESOLUTIONS:
+        files = synthetic.write_profiles(data_dir, resolution, max(entries))
+        for hours in HORIZONS:
+            series = models.PriceSeries(
+                np.array(synthetic.prices(hours)), start_time, 3600
+            )
+            for count in entries:
+                calculators = [
+                    price_calc.Calculator(appliance_file) for appliance_file in files[:count]
+                ]
+                # profiles are parsed before timing, like after the first calculation
+                price_calc.calculate_batch(calculators, series)
+
+                def calculate(calculators=calculators, series=series):
+                    # results are kept until every entry is calculated, like the hub does
+                    return [calculator.calculate_prices(series) for calculator in calculators]
+
+                def calculate_batch(calculators=calculators, series=series):
+                    price_calc.calculate_batch(calculators, series)
+
+                name = f"{resolution}s/{hours}h/{count}"
+                yield f"calculate_prices/{name}", calculate
+                yield f"calculate_batch/{name}", calculate_batch
+
+
+def json_attribute(value) -> str:
+    """Return attribute serialized for the state machine, datetime keys as ISO strings."""
+    if isinstance(value, dict):
+        value = {
+            key.isoformat() if isinstance(key, datetime) else key: item
+            for key, item in value.items()
+        }
+    return json.dumps(value, default=str)
+
+
+def lookup_cases():
+    """Yield name and function of every price_now and price_data case."""
+    price_calc = import_module("price_calc")
+    models = import_module("models")
+    attributes = import_module("attributes")
+    const = import_module("const")
+    try:
+        coordinator = import_module("coordinator")
+    except ImportError as err:
+        print(f"Skipping price_now, Home Assistant is not installed: {err}")
+        coordinator = None
+
+    # the time zone of Home Assistant is UTC outside of it, an hour after
+    # midnight is a start time of every horizon
+    midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    now = midnight + timedelta(hours=1)
+    start_time = midnight.replace(tzinfo=None)
+    with tempfile.TemporaryDirectory() as data_dir:
+        for resolution in RESOLUTIONS:
+            appliance_file = synthetic.write_profiles(data_dir, resolution, 1)[0]
+            for hours in HORIZONS:
+                series = models.PriceSeries(
+                    np.array(synthetic.prices(hours)), start_time, 3600
+                )
+                calcs = price_calc.Calculator(appliance_file).calculate_prices(series)
+                name = f"{resolution}s/{hours}h"
+
+                if coordinator is not None:
+
+                    def price_now(calcs=calcs):
+                        for _ in range(LOOKUPS):
+                            coordinator.price_now(calcs, now)
+
+                    yield f"price_now/{name}/x{LOOKUPS}", price_now
+
+                for mode in const.PRICE_DATA_MODES:
+
+                    def price_data(calcs=calcs, mode=mode):
+                        # rebuilt from scratch and serialized like after a recalculation
+                        calcs._prices_by_price = None
+                        json_attribute(attributes.build_price_data(calcs, mode))
+
+                    yield f"price_data/{mode}/{name}", price_data
+
+
+def prepare_data_cases(data_dir: str):
+    """Yield name and function of importing sensor history at every resolution."""
+    cal = import_module("cal")
+    for resolution in RESOLUTIONS:
+        rows = synthetic.history_rows(resolution)
+
+        def prepare_data(rows=rows, resolution=resolution):
+            # profiles are written to the temporary data dir and removed again
+            path = cal.prepare_data(
+                "benchmark",
+                "history",
+                "dishwasher",
+                f"{resolution}s",
+                "synthetic",
+                rows,
+                resolution,
+                data_dir,
+            )
+            os.remove(path)
+
+        yield f"prepare_data/{resolution}s/{len(rows)}rows", prepare_data
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print results next to the baseline and return names of regressed cases."""
+    regressed = []
+    print(f"{'case':<48} {'seconds':>10} {'baseline':>10} {'ratio':>6} {'peak MiB':>9}")
+    for name, result in results.items():
+        known = baseline.get(name)
+        ratio = result["seconds"] / known["seconds"] if known else None
+        if (
+            ratio is not None
+            and ratio > threshold
+            and result["seconds"] - known["seconds"] > NOISE_SECONDS
+        ):
+            regressed.append(name)
+        print(
+            f"{name:<48} {result['seconds']:>10.5f} "
+            f"{known['seconds'] if known else float('nan'):>10.5f} "
+            f"{ratio if ratio is not None else float('nan'):>6.2f} "
+            f"{result['peak_bytes'] / 2**20:>9.2f}"
+            + ("  REGRESSED" if name in regressed else "")
+        )
+    return regressed
+
+
+def main() -> int:
+    """Run benchmarks and compare with the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer entries and repeats")
+    parser.add_argument("--filter", default="", help="only run cases containing this")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    repeat = QUICK_REPEAT if args.quick else REPEAT
+    entries = QUICK_ENTRIES if args.quick else ENTRIES
+
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        cases = [
+            *calculation_cases(data_dir, entries),
+            *lookup_cases(),
+            *prepare_data_cases(data_dir),
+        ]
+        for name, function in cases:
+            if args.filter in name:
+                results[name] = measure(function, repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+        print(f"Saved baseline of {len(results)} cases to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        baseline = {}
+    regressed = compare(results, baseline, args.threshold)
+    if regressed:
+        print(f"{len(regressed)} cases are more than {args.threshold} times slower")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
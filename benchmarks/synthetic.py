@@ -0,0 +1,81 @@
+"""Synthetic appliance profiles, price series and sensor history for benchmarks."""
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+PROFILE_DURATION = 4 * 60 * 60
+HISTORY_INTERVAL = 10
+
+
+def profile_data(resolution: int, seed: int, duration: int = PROFILE_DURATION) -> dict:
+    """Return appliance file content of a heating, washing and drying cycle."""
+    rng = np.random.default_rng(seed)
+    samples = max(duration // resolution, 1)
+    phase = np.linspace(0, 1, samples)
+    power = (
+        2.0 * np.exp(-(((phase - 0.1) / 0.05) ** 2))
+        + 0.2
+        + 1.5 * np.exp(-(((phase - 0.8) / 0.08) ** 2))
+    ) * rng.uniform(0.8, 1.2)
+    energy_usage = power * resolution / 3600 * rng.uniform(0.9, 1.1, samples)
+    return {
+        "appliance_type": "dishwasher",
+        "appliance_manufactor": "benchmark",
+        "appliance_model": f"model_{seed}",
+        "appliance_mode": f"{resolution}s",
+        "measure_method": "synthetic",
+        "duration_in_minutes": duration // 60,
+        "energy_use_resolution_in_seconds": resolution,
+        "energy_usage": energy_usage.tolist(),
+    }
+
+
+def write_profiles(directory: str, resolution: int, count: int) -> list[str]:
+    """Write count different profiles of resolution, return their paths."""
+    paths = []
+    for seed in range(count):
+        path = os.path.join(directory, f"benchmark_{resolution}_{seed}.json")
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(profile_data(resolution, seed), file)
+        paths.append(path)
+    return paths
+
+
+def prices(hours: int, seed: int = 0) -> list[float]:
+    """Return hourly prices with a daily pattern."""
+    rng = np.random.default_rng(seed)
+    hour_of_day = np.arange(hours) % 24
+    daily = 1.2 + 0.5 * np.sin((hour_of_day - 6) / 24 * 2 * np.pi)
+    return (daily + rng.normal(0, 0.15, hours)).round(3).tolist()
+
+
+def history_rows(resolution: int, seed: int = 0) -> list[dict]:
+    """Return recorder rows of a cumulative energy sensor during one profile run.
+
+    Readings arrive about every HISTORY_INTERVAL seconds with jitter, or
+    every resolution seconds for coarser profiles.
+    """
+    rng = np.random.default_rng(seed)
+    energy_usage = np.array(profile_data(resolution, seed)["energy_usage"])
+    interval = max(HISTORY_INTERVAL, resolution)
+    count = PROFILE_DURATION // interval + 1
+    offsets = np.arange(count) * interval + rng.uniform(-1, 1, count)
+    offsets[0] = 0
+    cumulative = np.interp(
+        offsets,
+        np.arange(len(energy_usage) + 1) * resolution,
+        np.concatenate(([0.0], np.cumsum(energy_usage))),
+    )
+    start = datetime(2023, 1, 1, 12)
+    return [
+        {
+            "state": f"{value:.4f}",
+            "last_changed": (start + timedelta(seconds=float(offset))).isoformat(),
+        }
+        for offset, value in zip(offsets, cumulative)
+    ]
@@ -0,0 +1,99 @@
+"""Builders of the price_data attribute."""
+from __future__ import annotations
+
+import base64
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .const import (
+    DEFAULT_PRICE_DATA_MAX_BYTES,
+    DEFAULT_PRICE_DATA_TOP_K,
+    PRICE_DATA_COMPACT,
+    PRICE_DATA_HOURLY,
+    PRICE_DATA_QUARTER_HOURLY,
+    PRICE_DATA_TOP_K,
+)
+from .models import ApplianceCalculations
+
+AGGREGATE_SECONDS = {
+    PRICE_DATA_HOURLY: 3600,
+    PRICE_DATA_QUARTER_HOURLY: 900,
+}
+
+
+def top_k_prices(calcs: ApplianceCalculations, top_k: int) -> dict:
+    """Return the top_k cheapest start times and prices."""
+    return dict(calcs.by_rank(rank) for rank in range(min(top_k, len(calcs.order))))
+
+
+def aggregated_prices(calcs: ApplianceCalculations, seconds: int) -> dict:
+    """Return cheapest price of every period of seconds."""
+    resolution = calcs.energy_use_resolution_in_seconds
+    if seconds <= resolution:
+        return {
+            calcs.idx_to_dt(idx): price for idx, price in enumerate(calcs.prices.tolist())
+        }
+
+    # periods are aligned to the clock, the first one may be partial
+    first_period = calcs.start_time.replace(minute=0, second=0, microsecond=0)
+    into_period = (calcs.start_time - first_period).total_seconds() % seconds
+    first_period = calcs.start_time - timedelta(seconds=into_period)
+
+    slots = seconds // resolution
+    edges = np.arange(-(int(into_period) // resolution), len(calcs.prices), slots)
+    edges[0] = 0
+    minima = np.minimum.reduceat(calcs.prices, edges)
+
+    return {
+        first_period + timedelta(seconds=idx * seconds): price
+        for idx, price in enumerate(minima.tolist())
+    }
+
+
+def compact_prices(calcs: ApplianceCalculations, max_bytes: int) -> dict:
+    """Return prices encoded as base64 float32, downsampled to fit max_bytes."""
+    prices = calcs.prices.astype(np.float32)
+    resolution = calcs.energy_use_resolution_in_seconds
+    factor = 1
+
+    # every float32 takes 4 bytes, base64 adds a third
+    max_values = max(max_bytes * 3 // 16, 1)
+    if len(prices) > max_values:
+        factor = -(-len(prices) // max_values)
+        padding = -len(prices) % factor
+        prices = np.pad(prices, (0, padding), constant_values=np.inf)
+        prices = prices.reshape(-1, factor).min(axis=1)
+
+    return {
+        "start": calcs.start_time.isoformat(),
+        "resolution": resolution * factor,
+        "encoding": "base64_float32_le",
+        "data": base64.b64encode(prices.astype("<f4").tobytes()).decode("ascii"),
+    }
+
+
+def build_price_data(
+    calcs: ApplianceCalculations,
+    mode: str,
+    top_k: int = DEFAULT_PRICE_DATA_TOP_K,
+    max_bytes: int = DEFAULT_PRICE_DATA_MAX_BYTES,
+) -> dict:
+    """Return price_data attribute for mode."""
+    if mode == PRICE_DATA_TOP_K:
+        return top_k_prices(calcs, top_k)
+    if mode in AGGREGATE_SECONDS:
+        return aggregated_prices(calcs, AGGREGATE_SECONDS[mode])
+    if mode == PRICE_DATA_COMPACT:
+        return compact_prices(calcs, max_bytes)
+    return calcs.prices_by_price
+
+
+def price_data_key(calcs: ApplianceCalculations, mode: str) -> float:
+    """Return key changing when price_data of mode must be rebuilt for the same calcs.
+
+    Trimming passed start times only rebuilds the attribute once per
+    aggregation period, or once per hour for the other modes.
+    """
+    seconds = AGGREGATE_SECONDS.get(mode, 3600)
+    return (calcs.start_time - datetime.min).total_seconds() // seconds
@@ -3,25 +3,146 @@ import json
 import os
 import numpy as np
 
-def prepare_data(manufactor, model, type, mode, method, history_data):
+from .const import DATA_DIR, DEFAULT_RESOLUTION
+
+# initial number of energy deltas held, the buffer doubles when full
+INITIAL_BUFFER_SIZE = 4096
+
+
+def parse_row(row):
+	"""Return state and epoch timestamp of a recorder row, None if not numeric."""
+	if isinstance(row, dict):
+		state = row.get('state')
+		last_changed = row.get('last_changed')
+	else:
+		state = row.state
+		last_changed = row.last_changed
+	try:
+		state = float(state)
+	except (TypeError, ValueError):
+		return None
+	if isinstance(last_changed, str):
+		last_changed = datetime.datetime.fromisoformat(last_changed)
+	return state, last_changed.timestamp()
+
+
+def resample_cumulative(timestamps, cumulative, resolution):
+	"""Integrate cumulative readings onto a grid of resolution seconds starting at the first reading."""
+	duration = timestamps[-1] - timestamps[0]
+	slots = max(int(np.ceil(duration / resolution)), 1)
+	grid = timestamps[0] + np.arange(slots + 1) * resolution
+	return np.diff(np.interp(grid, timestamps, cumulative))
+
+
+def resample_profile(energy_usage, resolution, target_resolution):
+	"""Resample energy per slot to another resolution, conserving total energy."""
+	energy_usage = np.asarray(energy_usage, dtype=np.float64)
+	if target_resolution == resolution:
+		return energy_usage
+	cumulative = np.concatenate(([0.0], np.cumsum(energy_usage)))
+	timestamps = np.arange(len(cumulative)) * float(resolution)
+	return resample_cumulative(timestamps, cumulative, target_resolution)
+
+
+class HistoryError(ValueError):
+	"""Raised when sensor history holds too few numeric readings for a profile."""
+
+
+class HistoryImporter:
+	"""Turns chunks of recorder rows of a cumulative energy sensor into energy per slot.
+
+	Readings are interpolated onto an exact grid of resolution seconds, so
+	jitter in the update interval of the sensor does not shift the profile.
+	"""
+
+	def __init__(self, resolution=DEFAULT_RESOLUTION, size=INITIAL_BUFFER_SIZE):
+		"""Initialize importer with room for size deltas of resolution seconds."""
+		self.resolution = resolution
+		self.deltas = np.empty(size)
+		self.count = 0
+		self.first_timestamp = None
+		self.last_timestamp = None
+		self.last_state = None
+		# next grid point and the reading interpolated at the previous one
+		self.next_slot = 1
+		self.slot_value = None
+
+	def add_chunk(self, rows):
+		"""Parse a chunk of rows and append energy of completed slots to the buffer."""
+		parsed = [item for item in map(parse_row, rows) if item is not None]
+		if not parsed:
+			return
+		states = np.fromiter((item[0] for item in parsed), dtype=np.float64, count=len(parsed))
+		timestamps = np.fromiter((item[1] for item in parsed), dtype=np.float64, count=len(parsed))
+
+		# rows already seen in the previous chunk are skipped
+		if self.last_timestamp is not None:
+			new = timestamps > self.last_timestamp
+			states = np.concatenate(([self.last_state], states[new]))
+			timestamps = np.concatenate(([self.last_timestamp], timestamps[new]))
+		else:
+			self.first_timestamp = timestamps[0]
+			self.slot_value = states[0]
+		if len(timestamps) < 2 and self.last_timestamp is not None:
+			return
+
+		last_slot = int((timestamps[-1] - self.first_timestamp) // self.resolution)
+		if last_slot >= self.next_slot:
+			grid = self.first_timestamp + np.arange(self.next_slot, last_slot + 1) * self.resolution
+			values = np.interp(grid, timestamps, states)
+			self._append(np.diff(values, prepend=self.slot_value))
+			self.slot_value = values[-1]
+			self.next_slot = last_slot + 1
+
+		self.last_state = states[-1]
+		self.last_timestamp = timestamps[-1]
+
+	def finish(self):
+		"""Append energy of the last, partial slot."""
+		if self.first_timestamp is None or self.last_timestamp <= self.first_timestamp:
+			raise HistoryError("At least two numeric readings at different times are needed")
+		slot_start = self.first_timestamp + (self.next_slot - 1) * self.resolution
+		if self.last_timestamp is not None and self.last_timestamp > slot_start:
+			self._append(np.array([self.last_state - self.slot_value]))
+			self.slot_value = self.last_state
+			self.next_slot += 1
+
+	def _append(self, deltas):
+		"""Append deltas, growing the buffer when needed."""
+		needed = self.count + len(deltas)
+		if needed > len(self.deltas):
+			buffer = np.empty(max(needed, 2 * len(self.deltas)))
+			buffer[:self.count] = self.deltas[:self.count]
+			self.deltas = buffer
+		self.deltas[self.count:needed] = deltas
+		self.count = needed
+
+	@property
+	def energy_usage(self):
+		"""Return energy deltas imported so far."""
+		return self.deltas[:self.count]
+
+	@property
+	def duration_in_seconds(self):
+		"""Return seconds between first and last imported row."""
+		if self.first_timestamp is None:
+			return 0
+		return self.last_timestamp - self.first_timestamp
+
+
+def prepare_data(manufactor, model, type, mode, method, history_data, resolution=DEFAULT_RESOLUTION, data_dir=DATA_DIR):
 	"""Creates a .json file based on sensor history."""
-    # Count the number of objects in the list
-	count = len(history_data)
-
-	states = np.array([float(d['state']) for d in history_data])
-	timestamps = np.array([datetime.datetime.fromisoformat(item['last_changed']) for item in history_data])
-	# Calculate the differences between adjacent states
-	state_deltas = np.diff(states)
-	state_deltas_as_list = state_deltas.tolist()
-	time_deltas = np.diff(timestamps)
-	max_time_delta = np.max(time_deltas)
-	min_time_delta = np.min(time_deltas)
-	mean_time_delta = (np.mean(time_deltas)).total_seconds()
-	duration_in_minutes = (timestamps[-1] - timestamps[0]).total_seconds() // 60
-
-	data_dir = f"{os.path.dirname(__file__)}/data"
-	file_name = f"{manufactor}_{model}_{mode}"
-	file_path = f"{data_dir}/{file_name}".lower()
+	return prepare_data_from_chunks(manufactor, model, type, mode, method, [history_data], resolution, data_dir)
+
+
+def prepare_data_from_chunks(manufactor, model, type, mode, method, history_chunks, resolution=DEFAULT_RESOLUTION, data_dir=DATA_DIR):
+	"""Creates a .json file based on sensor history read in chunks."""
+	importer = HistoryImporter(resolution)
+	for chunk in history_chunks:
+		importer.add_chunk(chunk)
+	importer.finish()
+
+	duration_in_minutes = importer.duration_in_seconds // 60
 
 	data_as_json = {
 		"appliance_type": type,
@@ -30,10 +151,17 @@ def prepare_data(manufactor, model, type, mode, method, history_data):
 		"appliance_mode": mode,
 		"measure_method": method,
 		"duration_in_minutes": int(duration_in_minutes),
-		"energy_use_resolution_in_seconds": int(mean_time_delta),
-		"energy_usage": state_deltas_as_list
+		"energy_use_resolution_in_seconds": int(resolution),
+		"energy_usage": importer.energy_usage.tolist()
 	}
 
+	return write_profile(manufactor, model, mode, data_as_json, data_dir)
+
+
+def write_profile(manufactor, model, mode, data_as_json, data_dir=DATA_DIR):
+	"""Write profile to data dir without overwriting existing files."""
+	file_name = f"{manufactor}_{model}_{mode}"
+	file_path = f"{data_dir}/{file_name}".lower()
 
 	if os.path.exists(f"{file_path}.json"):
 		file_path_incrementor = 1
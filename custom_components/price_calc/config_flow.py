@@ -1,16 +1,15 @@
 """Adds config flow for Price calculator integration."""
 from __future__ import annotations
 
-import json
 import os
 
 from collections.abc import Mapping
+from datetime import timedelta
 from typing import Any
 
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.components.recorder import history, get_instance
 from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
 from homeassistant.const import CONF_NAME, CONF_FILE_PATH, CONF_URL
 from homeassistant.data_entry_flow import FlowResult
@@ -31,12 +30,21 @@ from .const import (
     CONF_MODEL,
     CONF_MANUFACTOR,
     CONF_FILE_SELECTOR,
-    CONF_ADD_PRICE_DATA
+    CONF_RESOLUTION,
+    CONF_ADD_PRICE_DATA,
+    CONF_PRICE_DATA_MODE,
+    CONF_PRICE_DATA_TOP_K,
+    CONF_PRICE_DATA_MAX_BYTES,
+    CONF_MAX_ERROR,
+    CONF_DEBUG_TIMINGS,
+    DEFAULT_PRICE_DATA_MAX_BYTES,
+    DEFAULT_PRICE_DATA_TOP_K,
+    DEFAULT_RESOLUTION,
+    PRICE_DATA_MODES,
+    PRICE_DATA_TOP_K,
+    RESOLUTIONS,
 )
 
-from .cal import prepare_data
-from .models import ApplianceData
-
 HISTORY_SOURCE_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_TYPE): selector.TextSelector(),
@@ -53,23 +61,56 @@ HISTORY_SOURCE_SCHEMA = vol.Schema(
         vol.Required(
             CONF_END_TIME
         ): selector.DateTimeSelector(selector.DateTimeSelectorConfig()),
+        vol.Required(
+            CONF_RESOLUTION, default=str(DEFAULT_RESOLUTION)
+        ): selector.SelectSelector(
+            selector.SelectSelectorConfig(options=[str(resolution) for resolution in RESOLUTIONS])
+        ),
     }
 )
 
-def get_files():
-    """Function to get files from data dir"""
-    data_dir = f"{os.path.dirname(__file__)}/data"
-    files = [file for file in os.listdir(data_dir) if file.endswith('.json')]
-    return files
-
-FILES_IN_DATA_DIR = get_files()
+HISTORY_CHUNK = timedelta(hours=1)
+
+
+def history_chunks(hass, entity_id, start_time, end_time):
+    """Yield recorder rows of entity in chunks of HISTORY_CHUNK."""
+    from homeassistant.components.recorder import history
+
+    chunk_start = start_time
+    while chunk_start < end_time:
+        chunk_end = min(chunk_start + HISTORY_CHUNK, end_time)
+        history_data = history.get_significant_states(
+            hass,
+            chunk_start,
+            chunk_end,
+            [entity_id],
+            None,
+            True,
+            False,
+            True,
+        )
+        # the full state at chunk start is already in the previous chunk
+        yield [
+            item
+            for item in history_data.get(entity_id, [])
+            if isinstance(item, dict) and 'friendly_name' not in item
+        ]
+        chunk_start = chunk_end
+
+
+def file_source_schema(options: list[dict]) -> vol.Schema:
+    """Return schema selecting one of the indexed profiles."""
+    return vol.Schema(
+        {
+            vol.Required(CONF_FILE_SELECTOR): selector.SelectSelector(
+                selector.SelectSelectorConfig(
+                    options=[selector.SelectOptionDict(**option) for option in options]
+                )
+            ),
+        }
+    )
 
-FILE_SOURCE_SCHEMA = vol.Schema(
-    {
-        vol.Required(CONF_FILE_SELECTOR): selector.SelectSelector(selector.SelectSelectorConfig(options=FILES_IN_DATA_DIR)),
 
-    }
-)
 URL_SOURCE_SCHEMA = vol.Schema({
     vol.Required(CONF_URL): selector.TextSelector(selector.TextSelectorConfig(type='url'))
 })
@@ -78,7 +119,20 @@ ENERGY_PRICE_SCHEMA = vol.Schema(
     {
     vol.Required(CONF_NAME, default='my appliance'): selector.TextSelector(),
     vol.Required(CONF_SOURCE_SENSOR): selector.EntitySelector(selector.EntitySelectorConfig(domain=SENSOR_DOMAIN)),
-    vol.Required(CONF_ADD_PRICE_DATA): selector.BooleanSelector()
+    vol.Required(CONF_ADD_PRICE_DATA): selector.BooleanSelector(),
+    vol.Required(CONF_PRICE_DATA_MODE, default=PRICE_DATA_TOP_K): selector.SelectSelector(
+        selector.SelectSelectorConfig(options=PRICE_DATA_MODES, translation_key=CONF_PRICE_DATA_MODE)
+    ),
+    vol.Required(CONF_PRICE_DATA_TOP_K, default=DEFAULT_PRICE_DATA_TOP_K): selector.NumberSelector(
+        selector.NumberSelectorConfig(min=1, max=500, mode=selector.NumberSelectorMode.BOX)
+    ),
+    vol.Required(CONF_PRICE_DATA_MAX_BYTES, default=DEFAULT_PRICE_DATA_MAX_BYTES): selector.NumberSelector(
+        selector.NumberSelectorConfig(min=256, max=65536, step=256, mode=selector.NumberSelectorMode.BOX)
+    ),
+    vol.Required(CONF_MAX_ERROR, default=0): selector.NumberSelector(
+        selector.NumberSelectorConfig(min=0, max=25, step=0.1, unit_of_measurement="%", mode=selector.NumberSelectorMode.BOX)
+    ),
+    vol.Required(CONF_DEBUG_TIMINGS, default=False): selector.BooleanSelector(),
     }
 )
 
@@ -122,28 +176,30 @@ class PriceCalcConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             if user_input[CONF_START_TIME] < user_input[CONF_END_TIME]:
                 start_time = as_local(parse_datetime(user_input[CONF_START_TIME]))
                 end_time = as_local(parse_datetime(user_input[CONF_END_TIME]))
-                entity_id = [user_input[CONF_HISTORY_SENSOR]]
-                filters = None
-                include_start_time_state = True
-                significant_changes_only = False
-                minimal_response = True
-
-                history_data = await get_instance(self.hass).async_add_executor_job(
-                    history.get_significant_states,
-                    self.hass,
-                    start_time,
-                    end_time,
-                    entity_id,
-                    filters,
-                    include_start_time_state,
-                    significant_changes_only,
-                    minimal_response,
-                )
-
-                filtered_items = [item for item in history_data.get(entity_id[0]) if isinstance(item, dict) and 'friendly_name' not in item]
-                self.file_path = prepare_data(user_input[CONF_MANUFACTOR], user_input[CONF_MODEL],user_input[CONF_TYPE], user_input[CONF_MODE], user_input[CONF_MEASURE_METHOD], filtered_items)
-
-                return await self.async_step_select_energy_price()
+                entity_id = user_input[CONF_HISTORY_SENSOR]
+
+                # recorder and numpy are only imported when a profile is created
+                from homeassistant.components.recorder import get_instance
+
+                from .cal import HistoryError, prepare_data_from_chunks
+
+                # rows are read and parsed in chunks in the recorder executor
+                try:
+                    self.file_path = await get_instance(self.hass).async_add_executor_job(
+                        prepare_data_from_chunks,
+                        user_input[CONF_MANUFACTOR],
+                        user_input[CONF_MODEL],
+                        user_input[CONF_TYPE],
+                        user_input[CONF_MODE],
+                        user_input[CONF_MEASURE_METHOD],
+                        history_chunks(self.hass, entity_id, start_time, end_time),
+                        int(user_input[CONF_RESOLUTION]),
+                    )
+                except HistoryError as err:
+                    LOGGER.error(err)
+                    errors["base"] = "not_enough_history"
+                else:
+                    return await self.async_step_select_energy_price()
 
         return self.async_show_form(
             step_id="from_sensor_history",
@@ -154,38 +210,38 @@ class PriceCalcConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
     async def async_step_from_file(self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         errors = {}
+        # profiles are only parsed and scanned when the form is used
+        from .library import PROFILE_LIBRARY
+        from .profiles import PROFILE_CACHE
+
         if user_input is not None:
-            appliance_file = f"{os.path.dirname(__file__)}/data/{user_input[CONF_FILE_SELECTOR]}"
+            appliance_file = os.path.join(
+                PROFILE_LIBRARY.data_dir, user_input[CONF_FILE_SELECTOR]
+            )
             try:
-                ApplianceData.parse_file(appliance_file)
+                await self.hass.async_add_executor_job(PROFILE_CACHE.get, appliance_file)
                 self.file_path = appliance_file
                 return await self.async_step_select_energy_price()
             except:
                 LOGGER.error("File not formatted correctly.")
                 return self.async_abort
 
-        return self.async_show_form(step_id='from_file', data_schema=FILE_SOURCE_SCHEMA, errors=errors)
+        # index is read and updated in the executor when the form is opened
+        options = await self.hass.async_add_executor_job(PROFILE_LIBRARY.options)
+        return self.async_show_form(step_id='from_file', data_schema=file_source_schema(options), errors=errors)
 
     async def async_step_from_url(self, user_input: dict[str, Any] | None = None) -> FlowResult:
         errors = {}
         if user_input is not None:
-            session = async_get_clientsession(self.hass)
-            resp = await session.get(user_input[CONF_URL])
-            data = await resp.json(content_type='text/plain')
+            from .download import DownloadError, ProfileDownloader
+
+            downloader = ProfileDownloader(self.hass, async_get_clientsession(self.hass))
             try:
-                appliance_data = ApplianceData.parse_obj(data)
-                data_dir = f"{os.path.dirname(__file__)}/data/"
-                file_name = f"{appliance_data.appliance_manufactor}_{appliance_data.appliance_model}_{appliance_data.appliance_mode}"
-                file_path = f"{data_dir}{file_name}.json"
-                with open(f"{file_path}", "w", encoding='utf-8') as file:
-                    file.write(json.dumps(data))
-                self.file_path = file_path
-                LOGGER.debug("Created file at: %s", file_path )
+                self.file_path = await downloader.async_download(user_input[CONF_URL])
                 return await self.async_step_select_energy_price()
-            except:
-                LOGGER.error("File not formatted correctly.")
-                return self.async_abort
-
+            except DownloadError as err:
+                LOGGER.error(err)
+                errors["base"] = "download_failed"
 
         return self.async_show_form(step_id='from_url', data_schema=URL_SOURCE_SCHEMA, errors=errors)
 
@@ -199,7 +255,12 @@ class PriceCalcConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             data = {CONF_SOURCE_SENSOR: user_input[CONF_SOURCE_SENSOR],
                     CONF_FILE_PATH: self.file_path,
                     CONF_NAME: user_input[CONF_NAME],
-                    CONF_ADD_PRICE_DATA: user_input[CONF_ADD_PRICE_DATA]}
+                    CONF_ADD_PRICE_DATA: user_input[CONF_ADD_PRICE_DATA],
+                    CONF_PRICE_DATA_MODE: user_input[CONF_PRICE_DATA_MODE],
+                    CONF_PRICE_DATA_TOP_K: int(user_input[CONF_PRICE_DATA_TOP_K]),
+                    CONF_PRICE_DATA_MAX_BYTES: int(user_input[CONF_PRICE_DATA_MAX_BYTES]),
+                    CONF_MAX_ERROR: float(user_input[CONF_MAX_ERROR]),
+                    CONF_DEBUG_TIMINGS: user_input[CONF_DEBUG_TIMINGS]}
 
             return self.async_create_entry(title=user_input[CONF_NAME], data=data)
 
@@ -1,5 +1,6 @@
 """Constants for Price calculator."""
 from logging import Logger, getLogger
+import os
 
 LOGGER: Logger = getLogger(__package__)
 
@@ -16,8 +17,52 @@ CONF_TYPE = 'type'
 CONF_MODEL = "model"
 CONF_MANUFACTOR = 'manufactor'
 CONF_FILE_SELECTOR = 'file_selector'
+CONF_RESOLUTION = 'resolution'
 CONF_ADD_PRICE_DATA = 'add_price_data'
+CONF_PRICE_DATA_MODE = 'price_data_mode'
+CONF_PRICE_DATA_TOP_K = 'price_data_top_k'
+CONF_PRICE_DATA_MAX_BYTES = 'price_data_max_bytes'
+CONF_MAX_ERROR = 'max_error'
+CONF_DEBUG_TIMINGS = 'debug_timings'
+
+DATA_HUBS = "hubs"
+
+# appliance profiles shipped, created and downloaded
+DATA_DIR = f"{os.path.dirname(__file__)}/data"
+SECONDS_PER_HOUR = 60 * 60
+
+# seconds per slot of created profiles
+DEFAULT_RESOLUTION = 60
+RESOLUTIONS = [1, 10, 30, 60, 300, 900]
+
+PRICE_DATA_FULL = "full"
+PRICE_DATA_TOP_K = "top_k"
+PRICE_DATA_HOURLY = "hourly"
+PRICE_DATA_QUARTER_HOURLY = "quarter_hourly"
+PRICE_DATA_COMPACT = "compact"
+PRICE_DATA_MODES = [
+    PRICE_DATA_FULL,
+    PRICE_DATA_TOP_K,
+    PRICE_DATA_HOURLY,
+    PRICE_DATA_QUARTER_HOURLY,
+    PRICE_DATA_COMPACT,
+]
+DEFAULT_PRICE_DATA_TOP_K = 10
+DEFAULT_PRICE_DATA_MAX_BYTES = 4096
 
 EDS_TODAY = "today"
 EDS_TOMORROW = "tomorrow"
 EDS_TOMORROW_VALID = "tomorrow_valid"
+
+SERVICE_IMPORT_PROFILES = "import_profiles"
+ATTR_URLS = "urls"
+SERVICE_BEST_START = "best_start"
+ATTR_EARLIEST_START = "earliest_start"
+ATTR_FINISH_BY = "finish_by"
+ATTR_BLOCKED = "blocked"
+SERVICE_PLAN_INTERRUPTIBLE = "plan_interruptible"
+ATTR_ENERGY = "energy"
+ATTR_POWER = "power"
+ATTR_MIN_SEGMENT = "min_segment"
+SERVICE_PLAN_HOUSEHOLD = "plan_household"
+ATTR_POWER_LIMIT = "power_limit"
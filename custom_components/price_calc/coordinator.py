@@ -1,14 +1,11 @@
 """Coordinator for Price calc."""
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 from homeassistant.const import CONF_FILE_PATH
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.event import (
-    async_track_state_change,
-    async_track_time_change,
-)
+from homeassistant.helpers.event import async_track_time_change
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
@@ -17,18 +14,21 @@ from homeassistant.helpers.update_coordinator import (
 from homeassistant.util.dt import as_local, now
 
 from .const import (
+    CONF_DEBUG_TIMINGS,
+    CONF_MAX_ERROR,
     CONF_SOURCE_SENSOR,
     LOGGER,
     DOMAIN,
-    EDS_TODAY,
-    EDS_TOMORROW,
-    EDS_TOMORROW_VALID,
 )
+from .hub import async_get_hub, async_release_hub
+from .instrumentation import STAGE_PRICE_NOW, Timings
 from .models import (
     ApplianceCalculations,
     ApplianceCalculationsCoordinator,
+    PriceSeries,
 )
 from .price_calc import Calculator
+from .profiles import PROFILE_CACHE
 
 
 @dataclass
@@ -37,6 +37,9 @@ class PriceCalcData:
 
     calcs: ApplianceCalculations
     updated: ApplianceCalculationsCoordinator
+    # start planned jointly with the other appliances of the household
+    household_start: datetime | None = None
+    household_price: float | None = None
 
 
 class PriceCalcUpdateCoordinator(DataUpdateCoordinator[PriceCalcData]):
@@ -48,27 +51,23 @@ class PriceCalcUpdateCoordinator(DataUpdateCoordinator[PriceCalcData]):
         self.hass = hass
         self.config_entry = entry
         self.listeners = []
-        self.price_entity_id = hass.states.get(entry.data[CONF_SOURCE_SENSOR])
+        self.calc = Calculator(
+            appliance_file=entry.data[CONF_FILE_PATH],
+            max_relative_error=entry.data.get(CONF_MAX_ERROR, 0) / 100,
+            timings=Timings(enabled=entry.data.get(CONF_DEBUG_TIMINGS, False)),
+        )
+        self.timings = self.calc.timings
+        # every entry keeps its profile cached, whatever the number of entries
+        PROFILE_CACHE.reserve(len(hass.config_entries.async_entries(DOMAIN)))
 
-        if self.price_entity_id.attributes[EDS_TOMORROW_VALID]:
-            self.prices = (
-                self.price_entity_id.attributes[EDS_TODAY]
-                + self.price_entity_id.attributes[EDS_TOMORROW]
-            )
-        else:
-            self.prices = self.price_entity_id.attributes[EDS_TODAY]
-        self.calc = Calculator(appliance_file=entry.data[CONF_FILE_PATH])
+        # prices are received and calculated by the hub of the price sensor
+        self.hub = async_get_hub(hass, entry.data[CONF_SOURCE_SENSOR])
+        self.hub.attach(self)
+        self.prices = self.hub.prices
 
-        self.listeners.append(
-            async_track_state_change(
-                self.hass,
-                [entry.data[CONF_SOURCE_SENSOR]],
-                self.update_calculations,
-            )
-        )
-        self.listeners.append(
-            async_track_time_change(self.hass, self.time_update, second=[0])
-        )
+        # time updates follow the resolution of the calculations
+        self._tick_seconds: int | None = None
+        self._unsub_time_update = None
 
         super().__init__(
             hass,
@@ -78,80 +77,127 @@ class PriceCalcUpdateCoordinator(DataUpdateCoordinator[PriceCalcData]):
             update_method=None,
         )
 
+    async def async_request_calculation(self) -> None:
+        """Calculate prices with the current prices of the hub."""
+        await self.hub.async_request_calculation(self)
+
+    @callback
+    def async_set_calculations(
+        self, new_calculations: ApplianceCalculations, electricity_prices: PriceSeries
+    ) -> None:
+        """Set new calculations made by the hub."""
+        self.prices = electricity_prices
+        new_calculations.trim(current_slot(new_calculations, now()))
+        with self.timings.measure(STAGE_PRICE_NOW):
+            new_prices = price_now(new_calculations, now())
+        self._async_schedule_time_update(tick_seconds(new_calculations))
+        self.async_set_updated_data(
+            PriceCalcData(calcs=new_calculations, updated=new_prices)
+        )
+
+    @callback
+    def async_set_household_start(self, start_time: datetime, price: float) -> None:
+        """Set start time planned by the household scheduler."""
+        if self.data is None:
+            return
+        self.async_set_updated_data(
+            replace(self.data, household_start=start_time, household_price=price)
+        )
+
     @callback
-    async def update_calculations(self, entity_id, old_state, new_state):
-        if (
-            old_state.attributes[EDS_TOMORROW_VALID] is False
-            and new_state.attributes[EDS_TOMORROW_VALID] is True
-        ):
-            LOGGER.debug("'Energi Data Service' has data available for tomorrow")
-            calculator = self.calc
-            new_electricity_prices = (
-                new_state.attributes[EDS_TODAY] + new_state.attributes[EDS_TOMORROW]
+    def _async_schedule_time_update(self, seconds: int) -> None:
+        """Schedule time updates at every start of a new current slot."""
+        if seconds == self._tick_seconds:
+            return
+        if self._unsub_time_update is not None:
+            self._unsub_time_update()
+
+        if seconds >= 3600:
+            self._unsub_time_update = async_track_time_change(
+                self.hass, self.time_update, minute=[0], second=[0]
             )
-            new_calculations = calculator.calculate_prices(new_electricity_prices)
-            new_prices = price_now(
-                new_calculations.prices_by_price,
-                now(),
-                new_calculations.latest_start_time,
-                new_calculations.energy_use_resolution_in_seconds
+        elif seconds % 60 == 0 and 3600 % seconds == 0:
+            self._unsub_time_update = async_track_time_change(
+                self.hass,
+                self.time_update,
+                minute=list(range(0, 60, seconds // 60)),
+                second=[0],
             )
-            self.async_set_updated_data(
-                PriceCalcData(calcs=new_calculations, updated=new_prices)
+        else:
+            self._unsub_time_update = async_track_time_change(
+                self.hass, self.time_update, second=[0]
             )
+        self._tick_seconds = seconds
+
+    @callback
+    def async_unload(self) -> None:
+        """Remove listeners and detach from the hub."""
+        for unsub in self.listeners:
+            unsub()
+        self.listeners = []
+        if self._unsub_time_update is not None:
+            self._unsub_time_update()
+            self._unsub_time_update = None
+            self._tick_seconds = None
+        async_release_hub(self.hass, self)
 
     @callback
     async def time_update(self, datetime):
         LOGGER.debug("--- Time update ---")
+        if self.data is None:
+            return
 
-        new_data = price_now(
-            self.data.calcs.prices_by_price, datetime, self.data.calcs.latest_start_time, self.data.calcs.energy_use_resolution_in_seconds
-        )
+        # start times passed are removed without recalculating
+        self.data.calcs.trim(current_slot(self.data.calcs, datetime))
+        with self.timings.measure(STAGE_PRICE_NOW):
+            new_data = price_now(self.data.calcs, datetime)
 
-        self.async_set_updated_data(
-            PriceCalcData(calcs=self.data.calcs, updated=new_data)
-        )
+        # nothing is written when current data did not change
+        if new_data == self.data.updated:
+            return
+
+        self.async_set_updated_data(replace(self.data, updated=new_data))
+
+
+def tick_seconds(calcs: ApplianceCalculations) -> int:
+    """Return seconds between changes of the current slot, at most once a minute."""
+    return max(calcs.energy_use_resolution_in_seconds, 60)
+
+
+def current_slot(calcs: ApplianceCalculations, now: datetime) -> datetime:
+    """Return start time of the slot holding now."""
+    return calcs.idx_to_dt(calcs.dt_to_idx(as_local(now).replace(tzinfo=None)))
 
 
 def price_now(
-    data_price: dict, now: datetime, last_start_time: datetime, resolution: int
+    calcs: ApplianceCalculations, now: datetime
 ) -> ApplianceCalculationsCoordinator:
     """Return current data."""
-    if resolution > 60:
-        current_time = as_local(now).replace(second=0, microsecond=0, minute=0, tzinfo=None)
-    else:
-        current_time = as_local(now).replace(second=0, microsecond=0, tzinfo=None)
-    current_price = data_price[current_time]
-
-    for time in data_price.keys():
-        if time >= current_time:
-            next_low_price = data_price[time]
-            next_lowest_price_dt = time
-            break
-
-    hourly_prices = []
-    hours_until_last_start = (
-        int((last_start_time - current_time).total_seconds()) // 3600
-    )
+    resolution = calcs.energy_use_resolution_in_seconds
+    current_time = current_slot(calcs, now)
+    current_idx = calcs.dt_to_idx(current_time)
+    current_price = calcs.price_at(current_time)
 
-    for delay in range(hours_until_last_start):
-        hourly_prices.append({delay: data_price[current_time + timedelta(hours=delay)]})
-    delay_hours = min(hourly_prices, key=lambda x: list(x.values())[0])
-    delay_hours = list(delay_hours.keys())[0]
-    delay_hours_price = data_price[(current_time + timedelta(hours=delay_hours))]
+    # cheapest start at or after current time
+    next_lowest_idx = calcs.next_lowest_idx[current_idx]
+    next_low_price = float(calcs.prices[next_lowest_idx])
+    next_lowest_price_dt = calcs.idx_to_dt(next_lowest_idx)
+
+    # cheapest start delayed by whole hours
+    delay_idx = calcs.hourly_lowest_idx[current_idx]
+    delay_hours = int(delay_idx - current_idx) * resolution // 3600
+    delay_hours_price = float(calcs.prices[delay_idx])
 
     diff_now_and_next_lowest = abs(current_price - next_low_price)
     diff_now_and_delay = abs(current_price - delay_hours_price)
 
-    resp = {
-        "current_time": current_time,
-        "current_price": current_price,
-        "next_lowest_price_dt": next_lowest_price_dt,
-        "next_low_price": next_low_price,
-        "diff_now_and_next_lowest": diff_now_and_next_lowest,
-        "delay_hours": delay_hours,
-        "delay_hours_price": delay_hours_price,
-        "diff_now_and_delay": diff_now_and_delay
-    }
-
-    return ApplianceCalculationsCoordinator.parse_obj(resp)
+    return ApplianceCalculationsCoordinator(
+        current_time=current_time,
+        current_price=current_price,
+        next_lowest_price_dt=next_lowest_price_dt,
+        next_low_price=next_low_price,
+        diff_now_and_next_lowest=diff_now_and_next_lowest,
+        delay_hours=delay_hours,
+        delay_hours_price=delay_hours_price,
+        diff_now_and_delay=diff_now_and_delay,
+    )
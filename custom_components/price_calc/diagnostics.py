@@ -0,0 +1,41 @@
+"""Diagnostics support for Price calc."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .profiles import PROFILE_CACHE
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics of a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    prices = coordinator.prices
+    calcs = coordinator.data.calcs if coordinator.data is not None else None
+
+    return {
+        "entry": dict(entry.data),
+        "prices": {
+            "count": len(prices),
+            "resolution": prices.resolution,
+            "start_time": prices.start_time,
+        },
+        "calculations": None
+        if calcs is None
+        else {
+            "starts": len(calcs.prices),
+            "resolution": calcs.energy_use_resolution_in_seconds,
+            "duration": calcs.duration_in_seconds,
+        },
+        "timings": coordinator.timings.as_dict(),
+        "profile_cache": PROFILE_CACHE.stats(),
+        "hub": {
+            "source_sensor": coordinator.hub.source_sensor,
+            "entries": len(coordinator.hub.coordinators),
+        },
+    }
@@ -0,0 +1,179 @@
+"""Download of appliance profiles into the data dir."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from threading import Lock
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import slugify
+
+from .const import LOGGER
+from .library import PROFILE_LIBRARY, ProfileLibrary
+from .models import ApplianceData
+
+DOWNLOADS_FILE = ".downloads.json"
+# largest profile accepted, the biggest shipped profile is a few kB
+MAX_PROFILE_BYTES = 4 * 1024 * 1024
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_CHUNK = 1 << 16
+DOWNLOAD_CONCURRENCY = 4
+
+# shared by every downloader, each service call and flow creates its own
+DOWNLOADS_LOCK = Lock()
+
+
+def write_atomic(path: str, content: bytes) -> None:
+    """Write content next to path and move it in place."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+class DownloadError(Exception):
+    """Raised when a profile could not be downloaded."""
+
+
+class ProfileDownloader:
+    """Download profiles, reusing files already in the library.
+
+    Validators of every downloaded URL are kept in DOWNLOADS_FILE so
+    repeated downloads are conditional requests, and a downloaded body
+    matching the checksum of an indexed profile is not written again.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        session: aiohttp.ClientSession,
+        library: ProfileLibrary = PROFILE_LIBRARY,
+        max_bytes: int = MAX_PROFILE_BYTES,
+        timeout: float = DOWNLOAD_TIMEOUT,
+    ) -> None:
+        """Initialize downloader storing profiles in the data dir of library."""
+        self.hass = hass
+        self.session = session
+        self.library = library
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.downloads_path = os.path.join(library.data_dir, DOWNLOADS_FILE)
+
+    async def async_download(self, url: str) -> str:
+        """Return path of profile at url, downloading it when changed."""
+        known = await self.hass.async_add_executor_job(self.cached, url)
+
+        headers = {}
+        if known is not None:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        try:
+            async with self.session.get(
+                url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as resp:
+                if resp.status == 304 and known is not None:
+                    LOGGER.debug("Profile at %s is unchanged", url)
+                    return known["path"]
+                if resp.status != 200:
+                    raise DownloadError(f"{url} returned status {resp.status}")
+                if resp.content_length is not None and resp.content_length > self.max_bytes:
+                    raise DownloadError(f"{url} is larger than {self.max_bytes} bytes")
+
+                body = bytearray()
+                async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK):
+                    body += chunk
+                    if len(body) > self.max_bytes:
+                        raise DownloadError(f"{url} is larger than {self.max_bytes} bytes")
+
+                validators = {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                }
+        except asyncio.TimeoutError as err:
+            raise DownloadError(f"Download of {url} timed out") from err
+        except aiohttp.ClientError as err:
+            raise DownloadError(f"Could not download {url}: {err}") from err
+
+        # parsing, hashing and writing run in the executor
+        return await self.hass.async_add_executor_job(
+            self.store, url, bytes(body), validators
+        )
+
+    async def async_download_all(
+        self, urls: list[str], concurrency: int = DOWNLOAD_CONCURRENCY
+    ) -> dict:
+        """Download urls with at most concurrency requests running.
+
+        Returns path or raised exception of every url.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(url: str) -> str:
+            async with semaphore:
+                return await self.async_download(url)
+
+        results = await asyncio.gather(
+            *(download(url) for url in urls), return_exceptions=True
+        )
+        return dict(zip(urls, results))
+
+    def _load_downloads(self) -> dict:
+        """Return stored validators of downloaded URLs."""
+        try:
+            with open(self.downloads_path, encoding="utf8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def cached(self, url: str) -> dict | None:
+        """Return stored download of url when its file still exists."""
+        with DOWNLOADS_LOCK:
+            known = self._load_downloads().get(url)
+        if known is None or not os.path.exists(known["path"]):
+            return None
+        return known
+
+    def store(self, url: str, body: bytes, validators: dict) -> str:
+        """Validate body and write it to the data dir, return its path."""
+        try:
+            appliance_data = ApplianceData.parse_raw(body)
+        except ValueError as err:
+            raise DownloadError(f"{url} is not an appliance profile: {err}") from err
+
+        checksum = hashlib.sha256(body).hexdigest()
+        with DOWNLOADS_LOCK:
+            self.library.scan(force=True)
+            file_name = self.library.find_checksum(checksum)
+            if file_name is None:
+                file_name = self._file_name(appliance_data, checksum)
+                write_atomic(os.path.join(self.library.data_dir, file_name), body)
+                LOGGER.debug("Created file at: %s", file_name)
+            file_path = os.path.join(self.library.data_dir, file_name)
+
+            downloads = self._load_downloads()
+            downloads[url] = {"path": file_path, "checksum": checksum, **validators}
+            write_atomic(self.downloads_path, json.dumps(downloads).encode("utf-8"))
+        return file_path
+
+    def _file_name(self, appliance_data: ApplianceData, checksum: str) -> str:
+        """Return file name of profile, not replacing a different profile.
+
+        Names come from the downloaded body and are slugified, so they can
+        not point outside the data dir.
+        """
+        file_name = slugify(
+            f"{appliance_data.appliance_manufactor}_"
+            f"{appliance_data.appliance_model}_{appliance_data.appliance_mode}"
+        )
+        if os.path.exists(os.path.join(self.library.data_dir, f"{file_name}.json")):
+            file_name = f"{file_name}_{checksum[:8]}"
+        return f"{file_name}.json"
@@ -0,0 +1,210 @@
+"""Window sum engines for price calculations."""
+
+from __future__ import annotations
+
+import numpy as np
+
+from .const import LOGGER
+
+BACKEND_AUTO = "auto"
+BACKEND_DIRECT = "direct"
+BACKEND_FFT = "fft"
+BACKEND_PIECEWISE = "piecewise"
+BACKENDS = [BACKEND_AUTO, BACKEND_DIRECT, BACKEND_FFT, BACKEND_PIECEWISE]
+
+# profiles at least this long are summed using FFT when backend is auto and
+# the profile has the resolution of the prices
+FFT_MIN_PROFILE_LENGTH = 64
+# maximum relative deviation from the reference implementation
+BACKEND_TOLERANCE = 1e-9
+
+
+def reference_window_sums(price_array: np.ndarray, energy_usage: np.ndarray) -> np.ndarray:
+    """Sum of price times usage for every window, using the original algorithm."""
+    energy_price_windows = np.lib.stride_tricks.sliding_window_view(
+        price_array, len(energy_usage)
+    )
+    return (energy_price_windows * energy_usage).sum(axis=1)
+
+
+def direct_window_sums(price_array: np.ndarray, energy_usage: np.ndarray) -> np.ndarray:
+    """Sum of price times usage for every window without an N x M temporary."""
+    if energy_usage.ndim == 1:
+        return np.correlate(price_array, energy_usage, mode="valid")
+
+    energy_price_windows = np.lib.stride_tricks.sliding_window_view(
+        price_array, energy_usage.shape[-1]
+    )
+    return (energy_price_windows @ energy_usage.T).T
+
+
+def fft_window_sums(price_array: np.ndarray, energy_usage: np.ndarray) -> np.ndarray:
+    """Sum of price times usage for every window using FFT convolution."""
+    price_length = len(price_array)
+    usage_length = energy_usage.shape[-1]
+    fft_length = 1 << (price_length + usage_length - 2).bit_length()
+
+    convolved = np.fft.irfft(
+        np.fft.rfft(price_array, fft_length)
+        * np.fft.rfft(energy_usage[..., ::-1], fft_length),
+        fft_length,
+    )
+    return convolved[..., usage_length - 1 : price_length]
+
+
+def bucket_matrix(energy_usage: np.ndarray, step: int) -> np.ndarray:
+    """Energy used in each price period for every offset into the first period.
+
+    Row r holds the energy used in price period k when the appliance is
+    started r usage steps after the start of a price period.
+    """
+    usage_length = energy_usage.shape[-1]
+    periods = (usage_length + step - 2) // step + 1
+
+    cumulative = np.zeros(energy_usage.shape[:-1] + (usage_length + 1,))
+    np.cumsum(energy_usage, axis=-1, out=cumulative[..., 1:])
+    edges = np.arange(periods + 1)[None, :] * step - np.arange(step)[:, None]
+    return np.diff(cumulative[..., np.clip(edges, 0, usage_length)], axis=-1)
+
+
+def piecewise_window_sums(
+    electricity_prices: np.ndarray,
+    energy_usage: np.ndarray,
+    step: int,
+    buckets: np.ndarray | None = None,
+) -> np.ndarray:
+    """Sum of price times usage for every window treating prices as constant per period."""
+    if buckets is None:
+        buckets = bucket_matrix(energy_usage, step)
+    periods = buckets.shape[-1]
+
+    window_count = len(electricity_prices) * step - energy_usage.shape[-1] + 1
+    if window_count <= 0:
+        return np.empty(energy_usage.shape[:-1] + (0,))
+
+    start_periods = -(-window_count // step)
+    padding = max(0, start_periods + periods - 1 - len(electricity_prices))
+    padded_prices = np.concatenate((electricity_prices, np.zeros(padding)))
+
+    price_windows = np.lib.stride_tricks.sliding_window_view(padded_prices, periods)
+    summed_prices = price_windows[:start_periods] @ np.swapaxes(buckets, -1, -2)
+    return summed_prices.reshape(buckets.shape[:-2] + (-1,))[..., :window_count]
+
+
+def select_backend(backend: str, usage_length: int, step: int = 1) -> str:
+    """Resolve auto backend based on length of energy usage and price step.
+
+    Profiles finer than the prices (step above 1) are summed piecewise per
+    price period. FFT is only picked for profiles at the resolution of the
+    prices holding at least FFT_MIN_PROFILE_LENGTH samples, like a profile
+    of 15 minute samples running 16 hours or longer on 15 minute prices.
+    """
+    if backend != BACKEND_AUTO:
+        return backend
+    if step > 1:
+        return BACKEND_PIECEWISE
+    if usage_length >= FFT_MIN_PROFILE_LENGTH:
+        return BACKEND_FFT
+    return BACKEND_DIRECT
+
+
+def window_sums(
+    electricity_prices: np.ndarray,
+    energy_usage: np.ndarray,
+    step: int,
+    backend: str = BACKEND_AUTO,
+    buckets: np.ndarray | None = None,
+) -> np.ndarray:
+    """Calculate price of every start position using selected backend.
+
+    Electricity prices hold one value per price period and step is the
+    number of usage samples per price period. Energy usage may hold one
+    profile of equal length per row, which are then summed in one pass.
+    """
+    usage_length = energy_usage.shape[-1]
+    if len(electricity_prices) * step < usage_length:
+        return np.empty(energy_usage.shape[:-1] + (0,))
+
+    backend = select_backend(backend, usage_length, step)
+    if backend == BACKEND_PIECEWISE:
+        return piecewise_window_sums(electricity_prices, energy_usage, step, buckets)
+
+    # convert energy prices array to a resolution matching energy usage
+    price_array = np.repeat(electricity_prices, step)
+    if backend == BACKEND_FFT:
+        return fft_window_sums(price_array, energy_usage)
+    if backend == BACKEND_DIRECT:
+        return direct_window_sums(price_array, energy_usage)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def check_backend(
+    electricity_prices: np.ndarray,
+    energy_usage: np.ndarray,
+    step: int,
+    summed_prices: np.ndarray,
+    tolerance: float = BACKEND_TOLERANCE,
+) -> bool:
+    """Compare summed prices with the reference implementation."""
+    reference = reference_window_sums(
+        np.repeat(electricity_prices, step), energy_usage
+    )
+    if reference.size == 0:
+        return summed_prices.size == 0
+    scale = max(float(np.max(np.abs(reference))), 1.0)
+    deviation = float(np.max(np.abs(summed_prices - reference))) / scale
+    if deviation > tolerance:
+        LOGGER.warning(
+            "Window sums deviate %s from reference (tolerance %s)",
+            deviation,
+            tolerance,
+        )
+        return False
+    return True
+
+
+def verified_window_sums(
+    electricity_prices: np.ndarray,
+    energy_usage: np.ndarray,
+    step: int,
+    summed_prices: np.ndarray,
+) -> np.ndarray:
+    """Return summed prices, recalculated by the direct backend when they fail the check."""
+    if check_backend(electricity_prices, energy_usage, step, summed_prices):
+        return summed_prices
+    LOGGER.warning("Recalculating window sums with the direct backend")
+    return window_sums(electricity_prices, energy_usage, step, BACKEND_DIRECT)
+
+
+def suffix_minima(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Minimum and its first index of values at or after every position."""
+    length = len(values)
+    reversed_values = values[::-1]
+    minima = np.minimum.accumulate(reversed_values)
+
+    # last position in reversed order reaching the minimum is the first in time
+    positions = np.where(reversed_values == minima, np.arange(length), 0)
+    positions = np.maximum.accumulate(positions)
+
+    return minima[::-1], (length - 1 - positions)[::-1]
+
+
+def strided_suffix_minima(
+    values: np.ndarray, stride: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Minimum and its first index of values[i], values[i + stride], ... for every i."""
+    length = len(values)
+    rows = -(-length // stride)
+    padded = np.full(rows * stride, np.inf)
+    padded[:length] = values
+
+    # every column is one residue class, suffix minima run down the rows
+    columns = padded.reshape(rows, stride)[::-1]
+    minima = np.minimum.accumulate(columns, axis=0)
+    row_index = np.arange(rows)[:, None]
+    positions = np.maximum.accumulate(
+        np.where(columns == minima, row_index, 0), axis=0
+    )
+    indexes = (rows - 1 - positions) * stride + np.arange(stride)
+
+    return minima[::-1].ravel()[:length], indexes[::-1].ravel()[:length]
@@ -0,0 +1,137 @@
+"""Joint start times of several appliances under a household power limit."""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from .cal import resample_profile
+from .const import SECONDS_PER_HOUR
+from .engine import window_sums
+from .profiles import PROFILE_CACHE
+
+# resolution of the grid appliances are placed on, or a divisor matching the prices
+HOUSEHOLD_RESOLUTION = 900
+# rounds of moving single appliances after the greedy placement
+HOUSEHOLD_ROUNDS = 10
+POWER_TOLERANCE = 1e-9
+
+
+@dataclass
+class HouseholdAppliance:
+    """Class holding power and start prices of an appliance on the grid."""
+
+    key: str
+    power: np.ndarray
+    costs: np.ndarray
+
+
+def appliance_on_grid(
+    key: str,
+    appliance_file: str,
+    electricity_prices: np.ndarray,
+    grid_seconds: int,
+    first_slot: int = 0,
+    price_resolution: int = SECONDS_PER_HOUR,
+) -> HouseholdAppliance:
+    """Return appliance resampled to the grid, starts before first_slot are unavailable."""
+    profile = PROFILE_CACHE.get(appliance_file)
+    usage = resample_profile(profile.energy_usage, profile.resolution, grid_seconds)
+    costs = window_sums(electricity_prices, usage, price_resolution // grid_seconds)
+    costs[: min(first_slot, len(costs))] = np.inf
+    return HouseholdAppliance(
+        key=key, power=usage * SECONDS_PER_HOUR / grid_seconds, costs=costs
+    )
+
+
+def cheapest_feasible(
+    appliance: HouseholdAppliance, load: np.ndarray, power_limit: float
+) -> int | None:
+    """Return cheapest start keeping load plus appliance within power_limit."""
+    if len(appliance.costs) == 0:
+        return None
+    windows = np.lib.stride_tricks.sliding_window_view(load, len(appliance.power))
+    peaks = (windows + appliance.power).max(axis=1)
+    costs = np.where(peaks <= power_limit + POWER_TOLERANCE, appliance.costs, np.inf)
+    start = int(np.argmin(costs))
+    if not np.isfinite(costs[start]):
+        return None
+    return start
+
+
+def schedule_household(
+    appliances: list[HouseholdAppliance],
+    horizon: int,
+    power_limit: float,
+    rounds: int = HOUSEHOLD_ROUNDS,
+) -> dict:
+    """Return start slot of every appliance, None when it can not run within the limit.
+
+    Appliances are placed greedily from the largest energy use at the
+    cheapest start fitting the limit. Afterwards every appliance in turn is
+    taken out and placed again at its cheapest fitting start, until a round
+    moves none.
+    """
+    load = np.zeros(horizon)
+    starts: dict = {}
+    order = sorted(appliances, key=lambda appliance: -appliance.power.sum())
+
+    def place(appliance: HouseholdAppliance, sign: int) -> None:
+        start = starts[appliance.key]
+        load[start : start + len(appliance.power)] += sign * appliance.power
+
+    for appliance in order:
+        starts[appliance.key] = cheapest_feasible(appliance, load, power_limit)
+        if starts[appliance.key] is not None:
+            place(appliance, 1)
+
+    for _ in range(rounds):
+        moved = False
+        for appliance in order:
+            start = starts[appliance.key]
+            if start is not None:
+                place(appliance, -1)
+            new_start = cheapest_feasible(appliance, load, power_limit)
+            if new_start is not None and (
+                start is None or appliance.costs[new_start] < appliance.costs[start]
+            ):
+                starts[appliance.key] = new_start
+                moved = True
+            if starts[appliance.key] is not None:
+                place(appliance, 1)
+        if not moved:
+            break
+
+    return starts
+
+
+def grid_resolution(price_resolution: int) -> int:
+    """Return resolution of the grid for prices of price_resolution."""
+    return math.gcd(HOUSEHOLD_RESOLUTION, price_resolution)
+
+
+def plan_household(
+    appliance_files: dict,
+    electricity_prices: list[float],
+    power_limit: float,
+    first_slot: int = 0,
+    price_resolution: int = SECONDS_PER_HOUR,
+) -> dict:
+    """Return start slot on the grid and price of every appliance file keyed like appliance_files."""
+    prices = np.array(electricity_prices, dtype=np.float64)
+    grid_seconds = grid_resolution(price_resolution)
+    horizon = len(prices) * (price_resolution // grid_seconds)
+    appliances = [
+        appliance_on_grid(
+            key, appliance_file, prices, grid_seconds, first_slot, price_resolution
+        )
+        for key, appliance_file in appliance_files.items()
+    ]
+    starts = schedule_household(appliances, horizon, power_limit)
+    return {
+        appliance.key: None
+        if starts[appliance.key] is None
+        else (starts[appliance.key], float(appliance.costs[starts[appliance.key]]))
+        for appliance in appliances
+    }
@@ -0,0 +1,178 @@
+"""Shared price source for entries using the same price sensor."""
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change
+from homeassistant.util.dt import start_of_local_day
+
+from .const import (
+    DATA_HUBS,
+    DOMAIN,
+    LOGGER,
+    EDS_TODAY,
+    EDS_TOMORROW,
+    EDS_TOMORROW_VALID,
+)
+from .models import PriceSeries
+from .price_calc import calculate_batch
+
+
+def get_prices(state) -> PriceSeries:
+    """Return available electricity prices of an 'Energi Data Service' state.
+
+    Prices start at midnight today, hourly or 15 minute prices are told
+    apart by the number of prices today.
+    """
+    tomorrow = None
+    if state.attributes[EDS_TOMORROW_VALID] is True:
+        tomorrow = state.attributes[EDS_TOMORROW]
+    return PriceSeries.from_days(
+        state.attributes[EDS_TODAY],
+        tomorrow,
+        start_of_local_day().replace(tzinfo=None),
+    )
+
+
+class PriceCalcHub:
+    """Receive price updates once and calculate every attached appliance in one batch."""
+
+    def __init__(self, hass: HomeAssistant, source_sensor: str) -> None:
+        """Initialize hub reading prices of source_sensor."""
+        self.hass = hass
+        self.source_sensor = source_sensor
+        self.prices = get_prices(hass.states.get(source_sensor))
+        self.coordinators: dict = {}
+
+        # coordinators waiting to be calculated and the task working through them
+        self._pending: dict = {}
+        self._prices_generation = 0
+        self._calculation_task: asyncio.Task | None = None
+
+        self._unsub = async_track_state_change(
+            hass, [source_sensor], self.update_calculations
+        )
+
+    def attach(self, coordinator) -> None:
+        """Attach coordinator of a config entry."""
+        self.coordinators[coordinator.config_entry.entry_id] = coordinator
+
+    def detach(self, coordinator) -> bool:
+        """Detach coordinator, return True when no coordinators are left."""
+        entry_id = coordinator.config_entry.entry_id
+        self.coordinators.pop(entry_id, None)
+        self._pending.pop(entry_id, None)
+        if self.coordinators:
+            return False
+        self._unsub()
+        return True
+
+    @callback
+    async def update_calculations(self, entity_id, old_state, new_state):
+        """Recalculate every attached appliance when prices for tomorrow arrive."""
+        if (
+            old_state.attributes[EDS_TOMORROW_VALID] is False
+            and new_state.attributes[EDS_TOMORROW_VALID] is True
+        ):
+            LOGGER.debug("'Energi Data Service' has data available for tomorrow")
+            self.prices = get_prices(new_state)
+            self._prices_generation += 1
+            await self.async_request_calculation(*self.coordinators.values())
+
+    def refresh_prices(self) -> bool:
+        """Read prices of the price sensor again, return True when they changed.
+
+        Entries joining a hub created on an earlier day are not calculated
+        on the prices of that day.
+        """
+        state = self.hass.states.get(self.source_sensor)
+        try:
+            prices = get_prices(state)
+        except (AttributeError, KeyError) as err:
+            LOGGER.debug("Keeping prices, %s has none: %s", self.source_sensor, err)
+            return False
+        if (
+            prices.start_time == self.prices.start_time
+            and prices.resolution == self.prices.resolution
+            and np.array_equal(prices.prices, self.prices.prices)
+        ):
+            return False
+        self.prices = prices
+        self._prices_generation += 1
+        return True
+
+    async def async_request_calculation(self, *coordinators) -> None:
+        """Calculate prices of coordinators in the executor.
+
+        Requests arriving while a calculation runs are coalesced into one
+        batch, which is calculated with the newest prices once the running
+        job finishes. When the prices have changed, every attached
+        coordinator is calculated again.
+        """
+        if self.refresh_prices():
+            coordinators = tuple(self.coordinators.values())
+        for coordinator in coordinators:
+            self._pending[coordinator.config_entry.entry_id] = coordinator
+
+        if self._calculation_task is None or self._calculation_task.done():
+            self._calculation_task = self.hass.async_create_task(
+                self._async_run_calculations()
+            )
+        await asyncio.shield(self._calculation_task)
+
+    async def _async_run_calculations(self) -> None:
+        """Calculate pending coordinators until none are waiting."""
+        while self._pending:
+            coordinators = list(self._pending.values())
+            electricity_prices = self.prices
+            generation = self._prices_generation
+            self._pending = {}
+
+            try:
+                new_calculations = await self.hass.async_add_executor_job(
+                    calculate_batch,
+                    [coordinator.calc for coordinator in coordinators],
+                    electricity_prices,
+                )
+            except Exception as err:  # pylint: disable=broad-except
+                LOGGER.error("Could not calculate prices: %s", err)
+                new_calculations = [err] * len(coordinators)
+            if generation != self._prices_generation:
+                LOGGER.debug("Dropping calculation of outdated prices")
+                continue
+
+            for coordinator, calculations in zip(coordinators, new_calculations):
+                if coordinator.config_entry.entry_id not in self.coordinators:
+                    continue
+                # only the entry whose calculation failed becomes unavailable
+                if isinstance(calculations, Exception):
+                    coordinator.async_set_update_error(calculations)
+                    continue
+                try:
+                    coordinator.async_set_calculations(
+                        calculations, electricity_prices
+                    )
+                except Exception as err:  # pylint: disable=broad-except
+                    LOGGER.error(
+                        "Could not update %s: %s", coordinator.config_entry.title, err
+                    )
+                    coordinator.async_set_update_error(err)
+
+
+def async_get_hub(hass: HomeAssistant, source_sensor: str) -> PriceCalcHub:
+    """Return hub of price sensor, creating it on first use."""
+    hubs = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_HUBS, {})
+    if source_sensor not in hubs:
+        hubs[source_sensor] = PriceCalcHub(hass, source_sensor)
+    return hubs[source_sensor]
+
+
+def async_release_hub(hass: HomeAssistant, coordinator) -> None:
+    """Detach coordinator from its hub, removing the hub when unused."""
+    hubs = hass.data[DOMAIN][DATA_HUBS]
+    hub = coordinator.hub
+    if hub.detach(coordinator):
+        hubs.pop(hub.source_sensor, None)
@@ -0,0 +1,132 @@
+"""Timings of the stages of calculating and publishing prices."""
+from __future__ import annotations
+
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+
+STAGE_PROFILE_LOAD = "profile_load"
+STAGE_ARRAYS = "arrays"
+STAGE_WINDOW_SUMS = "window_sums"
+STAGE_BUILD_RESULT = "build_result"
+STAGE_PRICE_NOW = "price_now"
+STAGE_ATTRIBUTES = "attributes"
+STAGES = [
+    STAGE_PROFILE_LOAD,
+    STAGE_ARRAYS,
+    STAGE_WINDOW_SUMS,
+    STAGE_BUILD_RESULT,
+    STAGE_PRICE_NOW,
+    STAGE_ATTRIBUTES,
+]
+
+# number of latest timings percentiles are calculated of
+TIMING_WINDOW = 100
+PERCENTILES = [50, 90, 99]
+
+# returned instead of a timer when timings are disabled
+NO_TIMER = nullcontext()
+
+
+class StageTimings:
+    """Counters and latest durations of a stage."""
+
+    __slots__ = ("count", "total", "max", "latest")
+
+    def __init__(self, window: int = TIMING_WINDOW) -> None:
+        """Initialize counters keeping the latest window durations."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.latest: deque = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        """Add duration of one run of the stage."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.latest.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        """Return percentile of the latest durations, nearest rank."""
+        if not self.latest:
+            return None
+        ordered = sorted(self.latest)
+        rank = max(round(percent / 100 * len(ordered)) - 1, 0)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def as_dict(self) -> dict:
+        """Return counters and percentiles in milliseconds."""
+        summary = {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "max_ms": self.max * 1000,
+        }
+        for percent in PERCENTILES:
+            value = self.percentile(percent)
+            summary[f"p{percent}_ms"] = None if value is None else value * 1000
+        return summary
+
+
+class StageTimer:
+    """Context manager adding the time spent inside it to a stage."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: StageTimings) -> None:
+        """Initialize timer adding to stage."""
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self) -> StageTimer:
+        """Start timing."""
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Add time spent since entering to the stage."""
+        self.stage.add(perf_counter() - self.start)
+
+
+class Timings:
+    """Timings of the stages of one entry, measured only when enabled."""
+
+    def __init__(self, enabled: bool = False, window: int = TIMING_WINDOW) -> None:
+        """Initialize timings without any stage measured."""
+        self.enabled = enabled
+        self.window = window
+        self.stages: dict = {}
+
+    def stage(self, name: str) -> StageTimings:
+        """Return timings of stage, creating them on first use."""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageTimings(self.window)
+        return stage
+
+    def measure(self, name: str):
+        """Return context manager timing stage, doing nothing when disabled."""
+        if not self.enabled:
+            return NO_TIMER
+        return StageTimer(self.stage(name))
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add duration measured elsewhere to stage when enabled."""
+        if self.enabled:
+            self.stage(name).add(seconds)
+
+    def reset(self) -> None:
+        """Remove all timings."""
+        self.stages = {}
+
+    def as_dict(self) -> dict:
+        """Return timings of every stage measured."""
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "stages": {
+                name: self.stages[name].as_dict()
+                for name in STAGES
+                if name in self.stages
+            },
+        }
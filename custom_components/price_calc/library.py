@@ -0,0 +1,162 @@
+"""Index of appliance profiles in the data dir."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+
+from .const import DATA_DIR, LOGGER
+from .models import ApplianceData
+from .profiles import BINARY_EXTENSION, read_binary_profile
+
+INDEX_FILE = ".index.json"
+INDEX_VERSION = 1
+# seconds before the data dir is scanned again
+SCAN_INTERVAL = 10
+
+
+def file_checksum(path: str) -> str:
+    """Return sha256 of file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_profile_data(path: str) -> ApplianceData:
+    """Return appliance data of a JSON or binary profile."""
+    if path.endswith(BINARY_EXTENSION):
+        return read_binary_profile(path).data
+    return ApplianceData.parse_file(path)
+
+
+class ProfileLibrary:
+    """Catalog of profiles, only reading files that changed since the last scan."""
+
+    def __init__(self, data_dir: str = DATA_DIR) -> None:
+        """Initialize library of data_dir, read on the first scan."""
+        self.data_dir = data_dir
+        self.index_path = os.path.join(data_dir, INDEX_FILE)
+        self.profiles: dict | None = None
+        self._scanned = 0.0
+        self._lock = Lock()
+
+    def _load_index(self) -> dict:
+        """Return stored index, empty if missing or outdated."""
+        try:
+            with open(self.index_path, encoding="utf8") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("profiles", {})
+
+    def _save_index(self) -> None:
+        """Store index next to the profiles."""
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf8") as file:
+                json.dump({"version": INDEX_VERSION, "profiles": self.profiles}, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError as err:
+            LOGGER.debug("Could not store profile index: %s", err)
+
+    def _profile_files(self) -> dict:
+        """Return stat of every selectable profile in the data dir."""
+        entries = {
+            entry.name: entry.stat()
+            for entry in os.scandir(self.data_dir)
+            # the index, download validators and temporary files are hidden
+            if entry.is_file()
+            and not entry.name.startswith(".")
+            and (entry.name.endswith(".json") or entry.name.endswith(BINARY_EXTENSION))
+        }
+        # binary profiles converted from a JSON profile are not listed
+        return {
+            name: stat
+            for name, stat in entries.items()
+            if not name.endswith(BINARY_EXTENSION)
+            or f"{os.path.splitext(name)[0]}.json" not in entries
+        }
+
+    def scan(self, force: bool = False) -> dict:
+        """Update index from the data dir and return it."""
+        with self._lock:
+            if (
+                self.profiles is not None
+                and not force
+                and time.monotonic() - self._scanned < SCAN_INTERVAL
+            ):
+                return self.profiles
+
+            if self.profiles is None:
+                self.profiles = self._load_index()
+
+            changed = False
+            files = self._profile_files()
+            for name in set(self.profiles) - set(files):
+                del self.profiles[name]
+                changed = True
+
+            for name, stat in files.items():
+                known = self.profiles.get(name)
+                if (
+                    known is not None
+                    and known["mtime_ns"] == stat.st_mtime_ns
+                    and known["size"] == stat.st_size
+                ):
+                    continue
+
+                path = os.path.join(self.data_dir, name)
+                try:
+                    appliance_data = read_profile_data(path)
+                except Exception as err:  # pylint: disable=broad-except
+                    LOGGER.warning("Skipping profile %s: %s", name, err)
+                    self.profiles.pop(name, None)
+                    continue
+
+                self.profiles[name] = {
+                    "type": appliance_data.appliance_type,
+                    "manufactor": appliance_data.appliance_manufactor,
+                    "model": appliance_data.appliance_model,
+                    "mode": appliance_data.appliance_mode,
+                    "resolution": appliance_data.energy_use_resolution_in_seconds,
+                    "duration": appliance_data.duration_in_minutes,
+                    "checksum": file_checksum(path),
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                }
+                changed = True
+
+            if changed:
+                self._save_index()
+            self._scanned = time.monotonic()
+            return self.profiles
+
+    def options(self) -> list[dict]:
+        """Return profiles as select options sorted by label."""
+        options = [
+            {
+                "value": name,
+                "label": (
+                    f"{profile['manufactor']} {profile['model']} ({profile['mode']}), "
+                    f"{profile['duration']} min, {profile['resolution']} s"
+                ),
+            }
+            for name, profile in self.scan().items()
+        ]
+        return sorted(options, key=lambda option: option["label"].lower())
+
+    def find_checksum(self, checksum: str) -> str | None:
+        """Return name of profile with checksum."""
+        for name, profile in self.scan().items():
+            if profile["checksum"] == checksum:
+                return name
+        return None
+
+
+PROFILE_LIBRARY = ProfileLibrary()
@@ -1,9 +1,91 @@
 """Models for price_calc."""
 
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
 
+import numpy as np
 from pydantic import BaseModel
 
+SECONDS_PER_DAY = 24 * 60 * 60
+# period lengths of electricity prices, recognized from the number of prices per day
+PRICE_RESOLUTIONS = [3600, 1800, 900, 300]
+
+
+def seconds_of_time(value: time) -> int:
+    """Return seconds since midnight of a time of day."""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def time_mask(
+    start_time: datetime,
+    offsets: np.ndarray,
+    duration: int,
+    earliest_start: datetime | None = None,
+    finish_by: datetime | None = None,
+    blocked: list[tuple[time, time]] = (),
+) -> np.ndarray:
+    """Return which runs starting offsets seconds after start_time meet the constraints."""
+    mask = np.ones(len(offsets), dtype=bool)
+    if earliest_start is not None:
+        mask &= offsets >= (earliest_start - start_time).total_seconds()
+    if finish_by is not None:
+        mask &= offsets + duration <= (finish_by - start_time).total_seconds()
+    if blocked:
+        seconds_of_day = (offsets + seconds_of_time(start_time.time())) % 86400
+        for block_start, block_end in blocked:
+            after_start = seconds_of_day >= seconds_of_time(block_start)
+            before_end = seconds_of_day < seconds_of_time(block_end)
+            if block_start <= block_end:
+                mask &= ~(after_start & before_end)
+            else:
+                mask &= ~(after_start | before_end)
+    return mask
+
+
+def infer_resolution(prices_per_day: int) -> int:
+    """Return seconds per price of a day holding prices_per_day prices.
+
+    Days with a daylight saving time change are one hour shorter or longer.
+    """
+    return min(
+        PRICE_RESOLUTIONS,
+        key=lambda resolution: abs(prices_per_day * resolution - SECONDS_PER_DAY),
+    )
+
+
+@dataclass
+class PriceSeries:
+    """Class holding electricity prices of equal periods starting at start_time."""
+
+    prices: np.ndarray
+    start_time: datetime
+    resolution: int = 3600
+
+    @classmethod
+    def from_days(
+        cls, today: list, tomorrow: list | None, start_time: datetime
+    ) -> "PriceSeries":
+        """Return prices of today and tomorrow, resolution given by number of prices today."""
+        prices = today + tomorrow if tomorrow else today
+        return cls(
+            prices=np.array(prices, dtype=np.float64),
+            start_time=start_time,
+            resolution=infer_resolution(len(today)),
+        )
+
+    def __len__(self) -> int:
+        """Return number of prices."""
+        return len(self.prices)
+
+    def idx_to_dt(self, idx: int) -> datetime:
+        """Convert index to start time of the price period."""
+        return self.start_time + timedelta(seconds=int(idx) * self.resolution)
+
+    def dt_to_idx(self, time: datetime) -> int:
+        """Convert time to index of the price period holding it."""
+        return int((time - self.start_time).total_seconds() // self.resolution)
+
 
 class ApplianceData(BaseModel):
     """Class representing appliance data."""
@@ -18,20 +100,125 @@ class ApplianceData(BaseModel):
     energy_usage: list
 
 
-class ApplianceCalculations(BaseModel):
-    """Class representing calculations of appliance."""
+@dataclass(slots=True)
+class ApplianceCalculations:
+    """Class representing calculations of appliance.
 
-    prices_by_price: dict
+    Price of starting at index i is prices[i], for the start time
+    start_time + i * energy_use_resolution_in_seconds. order holds the
+    indexes sorted from cheapest to most expensive. next_lowest_idx[i] is
+    the cheapest start at or after i and hourly_lowest_idx[i] the cheapest
+    of i, i + 1 hour, ... that still leaves a whole hour before the latest
+    start. Every run takes duration_in_seconds. Built from calculated
+    arrays without validation.
+    """
+
+    start_time: datetime
+    energy_use_resolution_in_seconds: int
+    duration_in_seconds: int
+    prices: np.ndarray
+    order: np.ndarray
+    next_lowest_idx: np.ndarray
+    hourly_lowest_idx: np.ndarray
     lowest_price: float
     lowest_price_dt: datetime
     highest_price: float
     highest_price_dt: datetime
     price_difference: float
     latest_start_time: datetime
-    energy_use_resolution_in_seconds: int
+
+    _prices_by_price: dict | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def idx_to_dt(self, idx: int) -> datetime:
+        """Convert index to start time."""
+        return self.start_time + timedelta(
+            seconds=int(idx) * self.energy_use_resolution_in_seconds
+        )
+
+    def dt_to_idx(self, time: datetime) -> int:
+        """Convert start time to index."""
+        return int(
+            (time - self.start_time).total_seconds()
+            // self.energy_use_resolution_in_seconds
+        )
+
+    def price_at(self, time: datetime) -> float:
+        """Return price of starting at time."""
+        idx = self.dt_to_idx(time)
+        if idx < 0:
+            raise IndexError(f"{time} is before first start time")
+        return float(self.prices[idx])
+
+    def by_rank(self, rank: int) -> tuple[datetime, float]:
+        """Return start time and price of the rank cheapest start, 0 being cheapest."""
+        idx = self.order[rank]
+        return self.idx_to_dt(idx), float(self.prices[idx])
+
+    def start_mask(
+        self,
+        earliest_start: datetime | None = None,
+        finish_by: datetime | None = None,
+        blocked: list[tuple[time, time]] = (),
+    ) -> np.ndarray:
+        """Return which start times meet the constraints.
+
+        Starts before earliest_start, runs ending after finish_by and starts
+        within any blocked time of day range are excluded. A range ending
+        before it starts wraps around midnight.
+        """
+        offsets = np.arange(len(self.prices)) * self.energy_use_resolution_in_seconds
+        return time_mask(
+            self.start_time,
+            offsets,
+            self.duration_in_seconds,
+            earliest_start,
+            finish_by,
+            blocked,
+        )
+
+    def best_start(
+        self,
+        earliest_start: datetime | None = None,
+        finish_by: datetime | None = None,
+        blocked: list[tuple[time, time]] = (),
+    ) -> tuple[datetime, float] | None:
+        """Return cheapest start time and price meeting the constraints."""
+        mask = self.start_mask(earliest_start, finish_by, blocked)
+        if not mask.any():
+            return None
+        idx = int(np.argmin(np.where(mask, self.prices, np.inf)))
+        return self.idx_to_dt(idx), float(self.prices[idx])
+
+    def trim(self, before: datetime) -> None:
+        """Remove start times before a time in place, keeping the latest start."""
+        first_idx = min(self.dt_to_idx(before), len(self.prices) - 1)
+        if first_idx <= 0:
+            return
+
+        self.start_time = self.idx_to_dt(first_idx)
+        self.prices = self.prices[first_idx:]
+        self.order = self.order[self.order >= first_idx] - first_idx
+        self.next_lowest_idx = self.next_lowest_idx[first_idx:] - first_idx
+        self.hourly_lowest_idx = self.hourly_lowest_idx[first_idx:] - first_idx
+        self._prices_by_price = None
+
+    @property
+    def prices_by_price(self) -> dict:
+        """Return start times and prices sorted by price, built on first use."""
+        if self._prices_by_price is None:
+            start_times = (
+                np.datetime64(self.start_time, "us")
+                + self.order * np.timedelta64(self.energy_use_resolution_in_seconds, "s")
+            ).tolist()
+            self._prices_by_price = dict(
+                zip(start_times, self.prices[self.order].tolist())
+            )
+        return self._prices_by_price
 
 
-class ApplianceCalculationsCoordinator(BaseModel):
+class ApplianceCalculationsCoordinator(NamedTuple):
     """Class representing calculations of appliance during runtime."""
 
     current_time: datetime
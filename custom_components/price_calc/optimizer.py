@@ -0,0 +1,215 @@
+"""Cheapest schedules of appliances that can be paused between price slots."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, time
+
+import numpy as np
+
+from .cal import resample_profile
+from .const import SECONDS_PER_HOUR
+from .models import time_mask
+from .profiles import PROFILE_CACHE
+
+# energy left for a last partial slot below this is dropped
+ENERGY_TOLERANCE = 1e-9
+
+# how a state of the dynamic programming was reached, distinct in both tables
+STAY_OFF = 0
+PAUSE = 1
+START = 2
+CONTINUE = 3
+EXTEND = 4
+
+
+@dataclass
+class Schedule:
+    """Class holding used slots, the energy used in each and their prices."""
+
+    slots: np.ndarray
+    energy: np.ndarray
+    prices: np.ndarray
+
+    @property
+    def cost(self) -> float:
+        """Return price of the schedule."""
+        return float(self.energy @ self.prices)
+
+    def segments(self) -> list[tuple[int, int, float, float]]:
+        """Return first slot, slot after the last, energy and cost of every run."""
+        edges = np.flatnonzero(np.diff(self.slots) != 1) + 1
+        bounds = np.concatenate(([0], edges, [len(self.slots)]))
+        costs = self.energy * self.prices
+        return [
+            (
+                int(self.slots[first]),
+                int(self.slots[last - 1]) + 1,
+                float(self.energy[first:last].sum()),
+                float(costs[first:last].sum()),
+            )
+            for first, last in zip(bounds[:-1], bounds[1:])
+        ]
+
+
+def flat_usage(energy: float, power: float, slot_seconds: int) -> np.ndarray:
+    """Return energy per slot of running at power until energy is used."""
+    per_slot = power * slot_seconds / SECONDS_PER_HOUR
+    if per_slot <= 0:
+        raise ValueError("Power must be above 0")
+    full_slots = int(energy // per_slot)
+    usage = np.full(full_slots, per_slot)
+    rest = energy - full_slots * per_slot
+    if rest > ENERGY_TOLERANCE:
+        usage = np.append(usage, rest)
+    return usage
+
+
+def is_flat(usage: np.ndarray) -> bool:
+    """Return True when every slot but a smaller last one uses the same energy."""
+    return len(usage) < 2 or (
+        np.all(usage[:-1] == usage[0]) and usage[-1] <= usage[0]
+    )
+
+
+def cheapest_slots(prices: np.ndarray, usage: np.ndarray) -> Schedule | None:
+    """Return cheapest slots for a flat usage, in any order.
+
+    Only the len(usage) cheapest prices are selected and sorted, the
+    partial last slot goes to the most expensive of them. Slots priced
+    inf are unavailable.
+    """
+    count = len(usage)
+    if count == 0:
+        return Schedule(np.empty(0, dtype=int), np.empty(0), np.empty(0))
+    if count > len(prices):
+        return None
+
+    chosen = np.argpartition(prices, count - 1)[:count]
+    chosen = chosen[np.argsort(prices[chosen], kind="stable")]
+    if not np.isfinite(prices[chosen[-1]]):
+        return None
+
+    by_time = np.argsort(chosen)
+    return Schedule(
+        slots=chosen[by_time],
+        energy=np.sort(usage)[::-1][by_time],
+        prices=prices[chosen][by_time],
+    )
+
+
+def cheapest_segments(
+    prices: np.ndarray, usage: np.ndarray, min_segment: int = 1
+) -> Schedule | None:
+    """Return cheapest slots running usage in order, in runs of at least min_segment slots.
+
+    Dynamic programming over the slots, keeping the cheapest cost of every
+    number of used usage samples and length of the current run, where
+    runs of min_segment slots or more share one state. Slots priced inf
+    are unavailable.
+    """
+    count = len(usage)
+    if count == 0:
+        return Schedule(np.empty(0, dtype=int), np.empty(0), np.empty(0))
+    min_segment = max(1, min(min_segment, count))
+    last_run = min_segment - 1
+
+    # off[j] paused after j samples, on[j, r] running for r + 1 slots after j samples
+    off = np.full(count + 1, np.inf)
+    off[0] = 0.0
+    on = np.full((count + 1, min_segment), np.inf)
+
+    off_choices = np.zeros((len(prices), count + 1), dtype=np.int8)
+    on_choices = np.zeros((len(prices), count + 1, min_segment), dtype=np.int8)
+
+    for slot, price in enumerate(prices):
+        cost = price * usage if np.isfinite(price) else np.full(count, np.inf)
+
+        new_on = np.full_like(on, np.inf)
+        new_on[1:, 1:] = on[:-1, :-1] + cost[:, None]
+        new_on[1:, 0] = off[:-1] + cost
+        on_choices[slot, 1:, 1:] = CONTINUE
+        on_choices[slot, 1:, 0] = START
+
+        # runs of min_segment slots or more stay in the same state
+        extended = on[:-1, last_run] + cost
+        longer = extended < new_on[1:, last_run]
+        new_on[1:, last_run] = np.where(longer, extended, new_on[1:, last_run])
+        on_choices[slot, 1:, last_run][longer] = EXTEND
+
+        # a run may only be paused once it reached min_segment slots
+        paused = on[:, last_run] < off
+        off_choices[slot] = np.where(paused, PAUSE, STAY_OFF)
+        off = np.where(paused, on[:, last_run], off)
+        on = new_on
+
+    if not np.isfinite(min(off[count], on[count, last_run])):
+        return None
+
+    # walk back through the choices collecting used slots
+    slots = []
+    samples = count
+    run = last_run if on[count, last_run] < off[count] else None
+    for slot in range(len(prices) - 1, -1, -1):
+        if run is None:
+            choice = off_choices[slot, samples]
+            if choice == PAUSE:
+                run = last_run
+            elif choice != STAY_OFF:
+                raise ValueError(f"Unknown choice {choice} while off")
+            continue
+
+        slots.append(slot)
+        choice = on_choices[slot, samples, run]
+        samples -= 1
+        if choice == START:
+            run = None
+        elif choice == CONTINUE:
+            run -= 1
+        elif choice != EXTEND:
+            raise ValueError(f"Unknown choice {choice} while running")
+
+    slots = np.array(slots[::-1], dtype=int)
+    return Schedule(slots=slots, energy=np.asarray(usage, dtype=float), prices=prices[slots])
+
+
+def cheapest_schedule(
+    prices: np.ndarray, usage: np.ndarray, min_segment: int = 1
+) -> Schedule | None:
+    """Return cheapest schedule, partially sorting prices when usage is flat."""
+    if min_segment <= 1 and is_flat(usage):
+        return cheapest_slots(prices, usage)
+    return cheapest_segments(prices, usage, min_segment)
+
+
+def plan_interruptible(
+    appliance_file: str,
+    electricity_prices: list[float],
+    start_time: datetime,
+    slot_seconds: int,
+    energy: float | None = None,
+    power: float | None = None,
+    min_segment_seconds: int = 0,
+    earliest_start: datetime | None = None,
+    finish_by: datetime | None = None,
+    blocked: list[tuple[time, time]] = (),
+) -> Schedule | None:
+    """Return cheapest price slots of an appliance that can be paused.
+
+    The profile is run in order at price resolution, unless energy or
+    power is given, then energy (default the energy of the profile) is
+    used at power (default the peak of the profile) in any slots.
+    """
+    profile = PROFILE_CACHE.get(appliance_file)
+    usage = resample_profile(profile.energy_usage, profile.resolution, slot_seconds)
+    if energy is not None or power is not None:
+        usage = flat_usage(
+            float(usage.sum()) if energy is None else energy,
+            float(usage.max()) * SECONDS_PER_HOUR / slot_seconds if power is None else power,
+            slot_seconds,
+        )
+
+    prices = np.array(electricity_prices, dtype=np.float64)
+    offsets = np.arange(len(prices)) * slot_seconds
+    mask = time_mask(start_time, offsets, slot_seconds, earliest_start, finish_by, blocked)
+    min_segment = -(-min_segment_seconds // slot_seconds)
+    return cheapest_schedule(np.where(mask, prices, np.inf), usage, min_segment)
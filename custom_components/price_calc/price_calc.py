@@ -1,17 +1,35 @@
 """Price calculation based on appliance data and energy prices."""
+from __future__ import annotations
 
-import json
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from datetime import datetime as dt, timedelta as td
+from time import perf_counter
 from typing import List
 
 import numpy as np
 
-from .models import ApplianceData, ApplianceCalculations
+from .engine import (
+    BACKEND_AUTO,
+    strided_suffix_minima,
+    suffix_minima,
+    verified_window_sums,
+    window_sums,
+)
+from .instrumentation import (
+    STAGE_ARRAYS,
+    STAGE_BUILD_RESULT,
+    STAGE_PROFILE_LOAD,
+    STAGE_WINDOW_SUMS,
+    Timings,
+)
+from .models import ApplianceCalculations, PriceSeries
+from .profiles import PROFILE_CACHE, ApplianceProfile
 
-from .const import LOGGER
+from .const import LOGGER, SECONDS_PER_HOUR
 
-SECONDS_PER_HOUR = 60 * 60
+# window sums of stacked profiles calculated in one pass
+BATCH_MAX_SUMS = 1 << 18
 EXAMPLLE_PRICES = [
     1.264,
     1.221,
@@ -69,91 +87,318 @@ class Calculator:
     """Handling all the calculations."""
 
     appliance_file: str
+    backend: str = BACKEND_AUTO
+    verify_backend: bool = False
+    # calculate on the coarsest profile level deviating at most this much
+    max_relative_error: float = 0.0
 
-    def calculate_prices(self, electricity_prices: List[float]):
-        """Calculate prices for running appliance."""
+    # prices and window sums of the previous calculation
+    _previous_prices: np.ndarray | None = field(default=None, init=False, repr=False)
+    _previous_sums: np.ndarray | None = field(default=None, init=False, repr=False)
+    _previous_profile: ApplianceProfile | None = field(
+        default=None, init=False, repr=False
+    )
+    _previous_start: dt | None = field(default=None, init=False, repr=False)
+    # time spent in each stage, only measured when enabled
+    timings: Timings = field(default_factory=Timings, repr=False, compare=False)
 
+    def calculate_prices(self, electricity_prices: PriceSeries | List[float]):
+        """Calculate prices for running appliance.
+
+        A plain list holds hourly prices starting at midnight today.
+        """
+
+        timings = self.timings
         self.electricity_prices = electricity_prices
+        with timings.measure(STAGE_ARRAYS):
+            series = price_series(electricity_prices)
 
-        with open(self.appliance_file, encoding="utf8") as file:
-            data = json.load(file)
-            appliance_data = ApplianceData.parse_obj(data)
+        # energy use is parsed once per file and shared between entries
+        with timings.measure(STAGE_PROFILE_LOAD):
+            profile = self.select_profile(series)
+            # number of energy usage samples per electricity price
+            step = profile.step(series.resolution)
+            buckets = profile.bucket_matrix(step)
+        energy_usage_array = profile.energy_usage
 
-        # create a numpy array of energy use
-        energy_usage_array = np.array(appliance_data.energy_usage)
-        energy_usage_length = len(energy_usage_array)
+        # only windows touching appended prices are calculated when possible
+        first_period = self.extension_start(series, profile)
 
-        # create a numpy array of electricity prices
-        energy_price_array = np.array(self.electricity_prices)
+        # sum price times usage for each window of length matching duration of appliance
+        with timings.measure(STAGE_WINDOW_SUMS):
+            summed_prices = window_sums(
+                series.prices[first_period:],
+                energy_usage_array,
+                step,
+                self.backend,
+                buckets,
+            )
+        if self.verify_backend:
+            summed_prices = verified_window_sums(
+                series.prices[first_period:],
+                energy_usage_array,
+                step,
+                summed_prices,
+            )
 
-        # convert energy prices array to a resolution matching energy usage
-        energy_price_array = np.repeat(
-            energy_price_array,
-            (SECONDS_PER_HOUR / appliance_data.energy_use_resolution_in_seconds),
-        )
+        with timings.measure(STAGE_BUILD_RESULT):
+            return self.finish(series, profile, summed_prices, first_period)
 
-        # create windows of energy prices of length matching duration of appliance
-        energy_price_windows = np.lib.stride_tricks.sliding_window_view(
-            energy_price_array, energy_usage_length
+    def select_profile(self, series: PriceSeries) -> ApplianceProfile:
+        """Return profile aligned to the price periods at the selected level."""
+        return (
+            PROFILE_CACHE.get(self.appliance_file)
+            .aligned(series.resolution)
+            .select_level(series.prices, self.max_relative_error, series.resolution)
         )
 
-        # calculate price for each point in the windows
-        calculated_prices = energy_price_windows * energy_usage_array
+    def extension_start(self, series: PriceSeries, profile: ApplianceProfile) -> int:
+        """Return first price period whose windows must be calculated.
 
-        # sum the prices for each row in the windows
-        summed_prices = calculated_prices.sum(axis=1)
+        When prices only have been appended to the prices of the previous
+        calculation, windows ending before the appended prices are kept.
+        """
+        previous_prices = self._previous_prices
+        if (
+            previous_prices is None
+            or profile is not self._previous_profile
+            or self._previous_start != series.start_time
+            or len(series.prices) <= len(previous_prices)
+            or not np.array_equal(series.prices[: len(previous_prices)], previous_prices)
+        ):
+            return 0
+        return len(self._previous_sums) // profile.step(series.resolution)
 
-        # create dict with datetime as key and price as value
-        summed_prices_dict_dt = {}
-        for idx, price in enumerate(summed_prices):
-            summed_prices_dict_dt[
-                self.idx_to_dt(idx, appliance_data.energy_use_resolution_in_seconds)
-            ] = price
+    def finish(
+        self,
+        series: PriceSeries,
+        profile: ApplianceProfile,
+        summed_prices: np.ndarray,
+        first_period: int,
+    ) -> ApplianceCalculations:
+        """Merge window sums with kept sums of previous calculation and build result."""
+        step = profile.step(series.resolution)
+        resolution = profile.resolution
 
-        summed_prices_dict_price = dict(
-            sorted(summed_prices_dict_dt.items(), key=lambda item: item[1])
-        )
+        if first_period:
+            LOGGER.debug("Calculated %s new start times", len(summed_prices))
+            summed_prices = np.concatenate(
+                (self._previous_sums[: first_period * step], summed_prices)
+            )
 
-        # calculate attributes
-        lowest_price = np.min(summed_prices)
-        lowest_price_dt = self.idx_to_dt(
-            np.argmin(summed_prices), appliance_data.energy_use_resolution_in_seconds
-        )
+        self._previous_prices = series.prices
+        self._previous_sums = summed_prices
+        self._previous_profile = profile
+        self._previous_start = series.start_time
 
-        highest_price = np.max(summed_prices)
-        highest_price_dt = self.idx_to_dt(
-            np.argmax(summed_prices), appliance_data.energy_use_resolution_in_seconds
+        return self.build_result(
+            summed_prices,
+            resolution,
+            len(profile.energy_usage) * resolution,
+            series.start_time,
         )
 
-        price_diff = highest_price - lowest_price
+    def build_result(
+        self,
+        summed_prices: np.ndarray,
+        resolution: int,
+        duration: int,
+        start_time: dt,
+    ) -> ApplianceCalculations:
+        """Build calculation result from the price of every start."""
+        # indexes sorted by price, kept instead of a datetime keyed dict
+        order = np.argsort(summed_prices, kind="stable")
 
-        latest_start_time = self.idx_to_dt(
-            len(summed_prices) - 1, appliance_data.energy_use_resolution_in_seconds
-        )
+        # cheapest start at or after every start, and delayed by whole hours
+        _, next_lowest_idx = suffix_minima(summed_prices)
+        hourly_lowest_idx = self.hourly_lowest_idx(summed_prices, resolution)
 
-        # return above calculations as a dict
-        results = {
-            "prices_by_price": summed_prices_dict_price,
-            "lowest_price": lowest_price,
-            "lowest_price_dt": lowest_price_dt,
-            "highest_price": highest_price,
-            "highest_price_dt": highest_price_dt,
-            "price_difference": price_diff,
-            "latest_start_time": latest_start_time,
-            "energy_use_resolution_in_seconds": appliance_data.energy_use_resolution_in_seconds
-        }
-
-        result_model = ApplianceCalculations.parse_obj(results)
+        # calculate attributes
+        lowest_idx = order[0]
+        highest_idx = np.argmax(summed_prices)
+        lowest_price = float(summed_prices[lowest_idx])
+        highest_price = float(summed_prices[highest_idx])
+
+        result_model = ApplianceCalculations(
+            start_time=start_time,
+            energy_use_resolution_in_seconds=int(resolution),
+            duration_in_seconds=int(duration),
+            prices=summed_prices,
+            order=order,
+            next_lowest_idx=next_lowest_idx,
+            hourly_lowest_idx=hourly_lowest_idx,
+            lowest_price=lowest_price,
+            lowest_price_dt=self.idx_to_dt(lowest_idx, resolution, start_time),
+            highest_price=highest_price,
+            highest_price_dt=self.idx_to_dt(highest_idx, resolution, start_time),
+            price_difference=highest_price - lowest_price,
+            latest_start_time=self.idx_to_dt(len(summed_prices) - 1, resolution, start_time),
+        )
         LOGGER.debug("---  ---  Calculations was made  ---  ---")
         return result_model
 
-    def idx_to_dt(self, idx: int, energy_use_resolution_in_seconds: int):
-        """Converts index of array to a datetime."""
+    @staticmethod
+    def hourly_lowest_idx(summed_prices: np.ndarray, resolution: int) -> np.ndarray:
+        """Index of cheapest start delayed by whole hours from every start."""
+        stride = max(SECONDS_PER_HOUR // resolution, 1)
+        hourly_lowest_idx = np.arange(len(summed_prices))
+
+        # delays must leave a whole hour before the latest start
+        candidates = summed_prices[: max(len(summed_prices) - stride, 0)]
+        if len(candidates):
+            hourly_lowest_idx[: len(candidates)] = strided_suffix_minima(
+                candidates, stride
+            )[1]
+        return hourly_lowest_idx
+
+    @staticmethod
+    def start_of_day() -> dt:
+        """Return datetime of the first price."""
+        return dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def idx_to_dt(
+        self,
+        idx: int,
+        energy_use_resolution_in_seconds: int,
+        start_time: dt | None = None,
+    ):
+        """Converts index of array to a datetime, counted from midnight by default."""
         idx = int(idx)
-        start_of_day = dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
-        return start_of_day + td(seconds=(idx * energy_use_resolution_in_seconds))
+        if start_time is None:
+            start_time = self.start_of_day()
+        return start_time + td(seconds=(idx * energy_use_resolution_in_seconds))
+
+
+def price_series(electricity_prices: PriceSeries | List[float]) -> PriceSeries:
+    """Return prices as series, a list holding hourly prices from midnight today."""
+    if isinstance(electricity_prices, PriceSeries):
+        return electricity_prices
+    return PriceSeries(
+        prices=np.array(electricity_prices, dtype=np.float64),
+        start_time=Calculator.start_of_day(),
+        resolution=SECONDS_PER_HOUR,
+    )
+
+
+def add_timing(calculators: List[Calculator], stage: str, seconds: float) -> None:
+    """Add duration of a shared stage to the timings of calculators."""
+    for calc in calculators:
+        calc.timings.add(stage, seconds)
+
+
+def calculate_batch(
+    calculators: List[Calculator], electricity_prices: PriceSeries | List[float]
+) -> List[ApplianceCalculations | Exception]:
+    """Calculate prices for several appliances sharing the same electricity prices.
+
+    Profiles of equal resolution, length and backend are stacked and summed
+    in one pass, profiles shared by several calculators are summed once.
+    Stacks hold at most BATCH_MAX_SUMS window sums, so long profiles at
+    high resolution are summed a few at a time without raising peak memory.
+    Time spent on shared arrays and sums is added to the timings of every
+    calculator sharing them. A calculator failing, like on a missing or
+    broken profile, gets its exception as result and the others are still
+    calculated.
+    """
+    start = perf_counter()
+    series = price_series(electricity_prices)
+    add_timing(calculators, STAGE_ARRAYS, perf_counter() - start)
+
+    results: List[ApplianceCalculations | Exception] = [None] * len(calculators)
+    profiles: dict = {}
+    groups: dict = {}
+    for idx, calc in enumerate(calculators):
+        try:
+            with calc.timings.measure(STAGE_PROFILE_LOAD):
+                profile = calc.select_profile(series)
+            key = (
+                profile.step(series.resolution),
+                len(profile.energy_usage),
+                calc.backend,
+                calc.extension_start(series, profile),
+            )
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.error("Could not calculate %s: %s", calc.appliance_file, err)
+            results[idx] = err
+            continue
+        profiles[idx] = profile
+        groups.setdefault(key, {}).setdefault(id(profile), []).append(idx)
+
+    for (step, length, backend, first_period), shared in groups.items():
+        window_count = len(series.prices[first_period:]) * step - length + 1
+        rows = list(shared.values())
+        chunk_size = max(BATCH_MAX_SUMS // max(window_count, 1), 1)
+        for chunk_start in range(0, len(rows), chunk_size):
+            calculate_stack(
+                calculators,
+                profiles,
+                rows[chunk_start : chunk_start + chunk_size],
+                series,
+                electricity_prices,
+                (step, backend, first_period),
+                results,
+            )
+
+    LOGGER.debug("Calculated prices for %s appliances", len(calculators))
+    return results
+
+
+def calculate_stack(
+    calculators: List[Calculator],
+    profiles: dict,
+    rows: List[List[int]],
+    series: PriceSeries,
+    electricity_prices: PriceSeries | List[float],
+    group: tuple,
+    results: List[ApplianceCalculations | Exception],
+) -> None:
+    """Sum stacked profiles, one row per list of calculator indexes, and store results."""
+    step, backend, first_period = group
+    stacked_calcs = [calculators[idx] for indexes in rows for idx in indexes]
+    try:
+        start = perf_counter()
+        energy_usage = np.stack([profiles[indexes[0]].energy_usage for indexes in rows])
+        buckets = np.stack(
+            [profiles[indexes[0]].bucket_matrix(step) for indexes in rows]
+        )
+        stacked = perf_counter()
+        add_timing(stacked_calcs, STAGE_ARRAYS, stacked - start)
+
+        summed_prices = window_sums(
+            series.prices[first_period:], energy_usage, step, backend, buckets
+        )
+        add_timing(stacked_calcs, STAGE_WINDOW_SUMS, perf_counter() - stacked)
+    except Exception as err:  # pylint: disable=broad-except
+        LOGGER.error("Could not calculate %s appliances: %s", len(stacked_calcs), err)
+        for indexes in rows:
+            for idx in indexes:
+                results[idx] = err
+        return
+
+    for row, indexes in enumerate(rows):
+        for idx in indexes:
+            calc = calculators[idx]
+            calc.electricity_prices = electricity_prices
+            try:
+                row_sums = summed_prices[row]
+                if calc.verify_backend:
+                    row_sums = verified_window_sums(
+                        series.prices[first_period:],
+                        energy_usage[row],
+                        step,
+                        row_sums,
+                    )
+                with calc.timings.measure(STAGE_BUILD_RESULT):
+                    results[idx] = calc.finish(
+                        series, profiles[idx], row_sums, first_period
+                    )
+            except Exception as err:  # pylint: disable=broad-except
+                LOGGER.error("Could not calculate %s: %s", calc.appliance_file, err)
+                results[idx] = err
 
 
 if __name__ == "__main__":
-    inf = Calculator("data/electrolux/eeq47200l.json").calculate_prices(EXAMPLLE_PRICES)
+    inf = Calculator(
+        os.path.join(os.path.dirname(__file__), "data", "electrolux_eeq47200l_eco.json")
+    ).calculate_prices(EXAMPLLE_PRICES)
     print(inf)
@@ -0,0 +1,352 @@
+"""Shared cache of parsed appliance profiles."""
+from __future__ import annotations
+
+import json
+import math
+import os
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+
+import numpy as np
+
+from .cal import resample_profile
+from .engine import bucket_matrix
+from .const import LOGGER, SECONDS_PER_HOUR
+from .models import ApplianceData
+
+# profiles cached at least, more when more entries are configured
+PROFILE_CACHE_SIZE = 32
+# coarser resolutions kept of every profile
+PYRAMID_RESOLUTIONS = [60, 300, 900, 3600]
+
+BINARY_EXTENSION = ".pcb"
+BINARY_MAGIC = b"PRICECALC\x01"
+BINARY_HEADER_LENGTH = struct.Struct("<I")
+BINARY_ALIGNMENT = 16
+
+
+@dataclass
+class ApplianceProfile:
+    """Class holding a parsed appliance file and its usage array."""
+
+    data: ApplianceData
+    energy_usage: np.ndarray
+    buckets: dict = field(default_factory=dict)
+    # built on first use, only profiles allowing an error use them
+    levels: dict | None = None
+    alignments: dict = field(default_factory=dict)
+    level_deviations: dict = field(default_factory=dict)
+
+    @property
+    def resolution(self) -> int:
+        """Return seconds per energy usage sample."""
+        return self.data.energy_use_resolution_in_seconds
+
+    def step(self, price_resolution: int = SECONDS_PER_HOUR) -> int:
+        """Return number of energy usage samples per price period."""
+        if price_resolution % self.resolution:
+            raise ValueError(
+                f"Resolution {self.resolution} does not divide price resolution {price_resolution}"
+            )
+        return price_resolution // self.resolution
+
+    def aligned(self, price_resolution: int) -> ApplianceProfile:
+        """Return profile at a resolution dividing price_resolution, built once per resolution.
+
+        Profiles not dividing the price periods are resampled to the greatest
+        common divisor of both resolutions, conserving total energy.
+        """
+        resolution = math.gcd(self.resolution, price_resolution)
+        if resolution == self.resolution:
+            return self
+        profile = self.alignments.get(resolution)
+        if profile is None:
+            profile = self.resampled(resolution)
+            self.alignments[resolution] = profile
+        return profile
+
+    def resampled(self, resolution: int) -> ApplianceProfile:
+        """Return profile resampled to resolution."""
+        energy_usage = resample_profile(self.energy_usage, self.resolution, resolution)
+        energy_usage.flags.writeable = False
+        return ApplianceProfile(
+            data=self.data.copy(
+                update={
+                    "energy_use_resolution_in_seconds": resolution,
+                    "energy_usage": [],
+                }
+            ),
+            energy_usage=energy_usage,
+        )
+
+    def build_levels(self) -> dict:
+        """Return coarser levels of the profile, built once and conserving total energy."""
+        if self.levels is None:
+            self.levels = {
+                resolution: self.resampled(resolution)
+                for resolution in PYRAMID_RESOLUTIONS
+                if resolution > self.resolution and not resolution % self.resolution
+            }
+        return self.levels
+
+    def level_deviation(self, level: ApplianceProfile, step: int) -> float:
+        """Largest difference of energy per price period of a level, relative to total energy.
+
+        A start of the profile is compared with the start of the level slot
+        it falls in, both start in the same price period. Built once per step.
+        """
+        key = (level.resolution, step)
+        deviation = self.level_deviations.get(key)
+        if deviation is None:
+            factor = level.resolution // self.resolution
+            buckets = self.bucket_matrix(step)
+            level_buckets = level.bucket_matrix(step // factor)
+            periods = max(buckets.shape[-1], level_buckets.shape[-1])
+            buckets = np.pad(buckets, ((0, 0), (0, periods - buckets.shape[-1])))
+            level_buckets = np.pad(
+                level_buckets, ((0, 0), (0, periods - level_buckets.shape[-1]))
+            )
+            difference = buckets - level_buckets[np.arange(step) // factor]
+            total = max(float(np.abs(self.energy_usage).sum()), np.finfo(float).tiny)
+            deviation = float(np.abs(difference).sum(axis=-1).max()) / total
+            self.level_deviations[key] = deviation
+        return deviation
+
+    def level_error(
+        self,
+        level: ApplianceProfile,
+        electricity_prices: np.ndarray,
+        price_resolution: int = SECONDS_PER_HOUR,
+    ) -> float:
+        """Bound of the deviation of a level from the profile for prices.
+
+        Windows starting in the same price period use the same energy, so
+        they differ by at most half the price range times the difference of
+        their energy per period. The bound is relative to running the
+        profile at the most expensive price and needs no window sums.
+        """
+        if len(electricity_prices) == 0:
+            return np.inf
+        highest = float(np.max(electricity_prices))
+        lowest = float(np.min(electricity_prices))
+        scale = max(highest, -lowest)
+        if scale <= 0:
+            return 0.0
+        deviation = self.level_deviation(level, self.step(price_resolution))
+        return deviation * (highest - lowest) / 2 / scale
+
+    def select_level(
+        self,
+        electricity_prices: np.ndarray,
+        max_relative_error: float,
+        price_resolution: int = SECONDS_PER_HOUR,
+    ) -> ApplianceProfile:
+        """Return coarsest level deviating at most max_relative_error for prices.
+
+        Levels are only built once an error above zero is allowed.
+        """
+        if max_relative_error <= 0:
+            return self
+        levels = self.build_levels()
+        for resolution in sorted(levels, reverse=True):
+            # levels must still divide the price periods
+            if price_resolution % resolution:
+                continue
+            level = levels[resolution]
+            if (
+                self.level_error(level, electricity_prices, price_resolution)
+                <= max_relative_error
+            ):
+                return level
+        return self
+
+    def bucket_matrix(self, step: int) -> np.ndarray:
+        """Return energy used per price period, built once per step."""
+        buckets = self.buckets.get(step)
+        if buckets is None:
+            buckets = bucket_matrix(self.energy_usage, step)
+            self.buckets[step] = buckets
+        return buckets
+
+
+class ProfileCache:
+    """Process wide LRU cache of appliance profiles keyed by path, mtime and size."""
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE) -> None:
+        """Initialize empty cache holding at most max_size profiles."""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._profiles: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, appliance_file: str) -> ApplianceProfile:
+        """Return profile for file, parsing it only if the file has changed."""
+        path = os.path.abspath(appliance_file)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                self.hits += 1
+                return profile
+            self.misses += 1
+
+        profile = self._load(path)
+
+        with self._lock:
+            # drop older versions of the same file before storing the new one
+            for old_key in [k for k in self._profiles if k[0] == path]:
+                del self._profiles[old_key]
+            self._profiles[key] = profile
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+        return profile
+
+    def reserve(self, size: int) -> None:
+        """Keep at least size profiles, never less than PROFILE_CACHE_SIZE.
+
+        Sized from the number of config entries, so a batch of every entry
+        does not evict the profiles it is about to use.
+        """
+        with self._lock:
+            self.max_size = max(size, PROFILE_CACHE_SIZE)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def clear(self) -> None:
+        """Clear cached profiles and counters."""
+        with self._lock:
+            self._profiles.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return cache counters."""
+        with self._lock:
+            return {
+                "size": len(self._profiles),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    @staticmethod
+    def _load(path: str) -> ApplianceProfile:
+        """Load appliance file and build usage array."""
+        if path.endswith(BINARY_EXTENSION):
+            return read_binary_profile(path)
+        return load_json_profile(path)
+
+
+def binary_path(path: str) -> str:
+    """Return path of binary profile converted from a JSON profile."""
+    return f"{os.path.splitext(path)[0]}{BINARY_EXTENSION}"
+
+
+def write_binary_profile(
+    path: str,
+    appliance_data: ApplianceData,
+    energy_usage: np.ndarray,
+    dtype: str = "<f8",
+    source: dict | None = None,
+) -> None:
+    """Write profile as magic, header length, JSON header and raw usage array.
+
+    source identifies the file the profile was converted from.
+    """
+    energy_usage = np.ascontiguousarray(energy_usage, dtype=dtype)
+    header = appliance_data.dict(exclude={"energy_usage"})
+    header["dtype"] = energy_usage.dtype.str
+    header["count"] = len(energy_usage)
+    header["source"] = source
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    # raw array starts aligned to BINARY_ALIGNMENT bytes
+    header_end = len(BINARY_MAGIC) + BINARY_HEADER_LENGTH.size + len(header_bytes)
+    header_bytes += b" " * (-header_end % BINARY_ALIGNMENT)
+
+    # written next to the final file and moved in place
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(BINARY_MAGIC)
+        file.write(BINARY_HEADER_LENGTH.pack(len(header_bytes)))
+        file.write(header_bytes)
+        file.write(energy_usage.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_binary_profile(path: str, source: dict | None = None) -> ApplianceProfile:
+    """Read binary profile, memory mapping the usage array.
+
+    When source is given the profile must have been converted from it.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a binary appliance profile")
+        (header_length,) = BINARY_HEADER_LENGTH.unpack(
+            file.read(BINARY_HEADER_LENGTH.size)
+        )
+        header = json.loads(file.read(header_length))
+
+    offset = len(BINARY_MAGIC) + BINARY_HEADER_LENGTH.size + header_length
+    dtype = header.pop("dtype")
+    count = header.pop("count")
+    if source is not None and header.pop("source", None) != source:
+        raise ValueError(f"{path} was not converted from the current source file")
+    header.pop("source", None)
+    appliance_data = ApplianceData.parse_obj({**header, "energy_usage": []})
+
+    if count:
+        energy_usage = np.memmap(
+            path, dtype=dtype, mode="r", offset=offset, shape=(count,)
+        )
+    else:
+        energy_usage = np.empty(0, dtype=dtype)
+    return ApplianceProfile(data=appliance_data, energy_usage=energy_usage)
+
+
+def source_stamp(path: str) -> dict:
+    """Return size and modification time identifying the contents of a file."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_json_profile(path: str) -> ApplianceProfile:
+    """Load JSON profile, through its binary conversion when up to date.
+
+    The conversion is used only when it was made of the JSON file with the
+    same size and modification time, so replacing the JSON file with an
+    older one converts it again.
+    """
+    converted = binary_path(path)
+    # stamped before reading, a change while parsing converts again next load
+    source = source_stamp(path)
+    try:
+        return read_binary_profile(converted, source)
+    except (OSError, ValueError):
+        pass
+
+    with open(path, encoding="utf8") as file:
+        appliance_data = ApplianceData.parse_obj(json.load(file))
+    energy_usage = np.array(appliance_data.energy_usage, dtype=np.float64)
+
+    # converted once, later loads skip JSON and pydantic parsing of the usage
+    try:
+        write_binary_profile(converted, appliance_data, energy_usage, source=source)
+    except OSError as err:
+        LOGGER.debug("Could not convert %s to binary: %s", path, err)
+
+    energy_usage.flags.writeable = False
+    return ApplianceProfile(
+        data=appliance_data.copy(update={"energy_usage": []}),
+        energy_usage=energy_usage,
+    )
+
+
+PROFILE_CACHE = ProfileCache()
@@ -11,17 +11,32 @@ from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
     SensorEntityDescription,
+    SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_NAME, CONF_FILE_PATH
+from homeassistant.const import CONF_NAME, CONF_FILE_PATH, EntityCategory, UnitOfTime
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.event import async_track_time_change
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
 from .coordinator import PriceCalcUpdateCoordinator, PriceCalcData
-from .const import DOMAIN, LOGGER, CONF_ADD_PRICE_DATA
+from .attributes import build_price_data, price_data_key
+from .const import (
+    DOMAIN,
+    LOGGER,
+    CONF_ADD_PRICE_DATA,
+    CONF_PRICE_DATA_MODE,
+    CONF_PRICE_DATA_TOP_K,
+    CONF_PRICE_DATA_MAX_BYTES,
+    CONF_DEBUG_TIMINGS,
+    DEFAULT_PRICE_DATA_MAX_BYTES,
+    DEFAULT_PRICE_DATA_TOP_K,
+    PRICE_DATA_FULL,
+)
 from .entity import PriceCalcEntity
+from .instrumentation import STAGE_ATTRIBUTES, STAGES
+from .models import ApplianceCalculations
 
 
 @dataclass
@@ -58,7 +73,9 @@ SENSORS = [
             "todays_highest": lambda x: x.calcs.highest_price,
             "today_highest_time": lambda x: x.calcs.highest_price_dt,
             "todays_lowest": lambda x: x.calcs.lowest_price,
-            "todays_lowest_time": lambda x: x.calcs.lowest_price_dt
+            "todays_lowest_time": lambda x: x.calcs.lowest_price_dt,
+            "household_start": lambda x: x.household_start,
+            "household_price": lambda x: x.household_price,
         },
     ),
 ]
@@ -75,6 +92,10 @@ async def async_setup_entry(
     async_add_entities(
         PriceCalcSensor(coordinator, description, entry) for description in SENSORS
     )
+    if entry.data.get(CONF_DEBUG_TIMINGS, False):
+        async_add_entities(
+            PriceCalcTimingSensor(coordinator, stage, entry) for stage in STAGES
+        )
 
 
 class PriceCalcSensor(PriceCalcEntity, SensorEntity):
@@ -94,16 +115,95 @@ class PriceCalcSensor(PriceCalcEntity, SensorEntity):
         self._attr_unique_id = f"{DOMAIN}_{entry.data[CONF_NAME]}_{entry.data[CONF_FILE_PATH]}"
         self._attr_name = f"{entry.data[CONF_NAME]}"
 
+        # entries created before price data modes keep the full attribute
+        self._price_data_mode = entry.data.get(CONF_PRICE_DATA_MODE, PRICE_DATA_FULL)
+        self._price_data_top_k = entry.data.get(
+            CONF_PRICE_DATA_TOP_K, DEFAULT_PRICE_DATA_TOP_K
+        )
+        self._price_data_max_bytes = entry.data.get(
+            CONF_PRICE_DATA_MAX_BYTES, DEFAULT_PRICE_DATA_MAX_BYTES
+        )
+        # kept instead of its id, which a later result could reuse
+        self._price_data_calcs: ApplianceCalculations | None = None
+        self._price_data_key: float | None = None
+        self._price_data: dict | None = None
+
+    @property
+    def available(self) -> bool:
+        """Return False until the first calculation is done."""
+        return super().available and self.coordinator.data is not None
+
     @property
     def native_value(self) -> date | None:
+        if self.coordinator.data is None:
+            return None
         return self.entity_description.value_fn(self.coordinator.data)
 
     @property
     def extra_state_attributes(self) -> Mapping[str, Any] | None:
-        attr = {}
-        for key in self.entity_description.attrs:
-            attr[key] = self.entity_description.attrs[key](self.coordinator.data)
-        if self.coordinator.config_entry.data[CONF_ADD_PRICE_DATA] is True:
-            attr['price_data'] = self.coordinator.data.calcs.prices_by_price
+        if self.coordinator.data is None:
+            return None
+        with self.coordinator.timings.measure(STAGE_ATTRIBUTES):
+            attr = {}
+            for key in self.entity_description.attrs:
+                attr[key] = self.entity_description.attrs[key](self.coordinator.data)
+            if self.coordinator.config_entry.data[CONF_ADD_PRICE_DATA] is True:
+                attr['price_data'] = self.price_data()
 
         return attr
+
+    def price_data(self) -> dict:
+        """Return price_data attribute, only rebuilt when calculations change."""
+        calcs = self.coordinator.data.calcs
+        key = price_data_key(calcs, self._price_data_mode)
+        if calcs is not self._price_data_calcs or key != self._price_data_key:
+            self._price_data = build_price_data(
+                calcs,
+                self._price_data_mode,
+                self._price_data_top_k,
+                self._price_data_max_bytes,
+            )
+            self._price_data_calcs = calcs
+            self._price_data_key = key
+        return self._price_data
+
+
+class PriceCalcTimingSensor(PriceCalcEntity, SensorEntity):
+    """90th percentile of the time spent in a stage of calculating prices."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = "mdi:timer-outline"
+
+    def __init__(
+        self,
+        coordinator: PriceCalcUpdateCoordinator,
+        stage: str,
+        entry: ConfigEntry,
+    ) -> None:
+        """Initialize sensor of the timings of stage."""
+        super().__init__(coordinator, entry)
+
+        self._stage = stage
+        self._attr_unique_id = (
+            f"{DOMAIN}_{entry.data[CONF_NAME]}_{entry.data[CONF_FILE_PATH]}_timing_{stage}"
+        )
+        self._attr_translation_key = f"timing_{stage}"
+
+    @property
+    def native_value(self) -> float | None:
+        """Return 90th percentile of the latest durations in milliseconds."""
+        stage = self.coordinator.timings.stages.get(self._stage)
+        if stage is None or stage.count == 0:
+            return None
+        return round(stage.percentile(90) * 1000, 3)
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any] | None:
+        """Return counters and percentiles of the stage."""
+        stage = self.coordinator.timings.stages.get(self._stage)
+        if stage is None:
+            return None
+        return stage.as_dict()
@@ -0,0 +1,308 @@
+"""Services of Price calculator."""
+from __future__ import annotations
+
+from datetime import datetime, time, timedelta
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, entity_registry as er
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ATTR_BLOCKED,
+    ATTR_EARLIEST_START,
+    ATTR_ENERGY,
+    ATTR_FINISH_BY,
+    ATTR_MIN_SEGMENT,
+    ATTR_POWER,
+    ATTR_POWER_LIMIT,
+    ATTR_URLS,
+    DOMAIN,
+    LOGGER,
+    SERVICE_BEST_START,
+    SERVICE_IMPORT_PROFILES,
+    SERVICE_PLAN_HOUSEHOLD,
+    SERVICE_PLAN_INTERRUPTIBLE,
+)
+
+
+def time_range(value) -> tuple[time, time]:
+    """Validate a time of day range written as 'HH:MM-HH:MM'."""
+    start, separator, end = cv.string(value).partition("-")
+    if not separator:
+        raise vol.Invalid(f"Invalid time range: {value}")
+    return cv.time(start.strip()), cv.time(end.strip())
+
+
+IMPORT_PROFILES_SCHEMA = vol.Schema(
+    {vol.Required(ATTR_URLS): vol.All(cv.ensure_list, [cv.url])}
+)
+
+BEST_START_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_id,
+        vol.Optional(ATTR_EARLIEST_START): vol.Any(cv.datetime, cv.time),
+        vol.Optional(ATTR_FINISH_BY): vol.Any(cv.datetime, cv.time),
+        vol.Optional(ATTR_BLOCKED, default=[]): vol.All(cv.ensure_list, [time_range]),
+    }
+)
+
+PLAN_INTERRUPTIBLE_SCHEMA = BEST_START_SCHEMA.extend(
+    {
+        vol.Optional(ATTR_ENERGY): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(ATTR_POWER): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+        vol.Optional(ATTR_MIN_SEGMENT, default=0): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    }
+)
+
+PLAN_HOUSEHOLD_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_POWER_LIMIT): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+    }
+)
+
+
+def local_naive(value: datetime | time, after: datetime) -> datetime:
+    """Return value as naive local datetime like the calculations.
+
+    A time of day is its first occurrence after after.
+    """
+    if isinstance(value, time):
+        value = datetime.combine(after.date(), value)
+        if value <= after:
+            value += timedelta(days=1)
+        return value
+    if value.tzinfo is not None:
+        value = dt_util.as_local(value).replace(tzinfo=None)
+    return value
+
+
+def local_isoformat(value: datetime) -> str:
+    """Return naive local datetime as isoformat with time zone."""
+    return value.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE).isoformat()
+
+
+def next_slot_start(start_time: datetime, resolution: int, now: datetime) -> datetime:
+    """Return first start of a slot of resolution seconds from start_time not before now."""
+    passed = (now - start_time).total_seconds()
+    return start_time + timedelta(seconds=max(int(-(-passed // resolution)), 0) * resolution)
+
+
+def coordinator_of_entity(hass: HomeAssistant, entity_id: str):
+    """Return coordinator of the config entry holding entity."""
+    entry = er.async_get(hass).async_get(entity_id)
+    entries = hass.data.get(DOMAIN, {})
+    if entry is None or entry.config_entry_id not in entries:
+        raise HomeAssistantError(f"{entity_id} is not a price calc sensor")
+    return entries[entry.config_entry_id]["coordinator"]
+
+
+def coordinators_of_household(hass: HomeAssistant) -> dict:
+    """Return coordinator of every price calc sensor keyed by entity id.
+
+    Diagnostic entities, like the timing sensors, are skipped so every
+    entry is planned once.
+    """
+    registry = er.async_get(hass)
+    coordinators = {}
+    for entry_id, entry_data in hass.data.get(DOMAIN, {}).items():
+        if not isinstance(entry_data, dict) or "coordinator" not in entry_data:
+            continue
+        for entity in er.async_entries_for_config_entry(registry, entry_id):
+            if entity.entity_category is None:
+                coordinators[entity.entity_id] = entry_data["coordinator"]
+    return coordinators
+
+
+def unique_coordinators(coordinators: dict) -> dict:
+    """Return coordinators keeping the first entity of every config entry."""
+    unique = {}
+    entry_ids = set()
+    for entity_id, coordinator in coordinators.items():
+        if coordinator.config_entry.entry_id not in entry_ids:
+            entry_ids.add(coordinator.config_entry.entry_id)
+            unique[entity_id] = coordinator
+    return unique
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register services of the integration."""
+
+    async def import_profiles(call: ServiceCall) -> None:
+        """Download appliance files of every url into the data dir."""
+        from .download import ProfileDownloader
+
+        downloader = ProfileDownloader(hass, async_get_clientsession(hass))
+        results = await downloader.async_download_all(call.data[ATTR_URLS])
+        for url, result in results.items():
+            if isinstance(result, Exception):
+                LOGGER.error("Could not import %s: %s", url, result)
+            else:
+                LOGGER.debug("Imported %s to %s", url, result)
+
+    async def best_start(call: ServiceCall) -> ServiceResponse:
+        """Return cheapest start of an appliance meeting the constraints."""
+        coordinator = coordinator_of_entity(hass, call.data[ATTR_ENTITY_ID])
+        if coordinator.data is None:
+            raise HomeAssistantError("Prices are not calculated yet")
+        calcs = coordinator.data.calcs
+
+        # the slot in progress is kept by the calculations, but has started
+        now = dt_util.now().replace(tzinfo=None)
+        earliest_start = next_slot_start(
+            calcs.start_time, calcs.energy_use_resolution_in_seconds, now
+        )
+        if ATTR_EARLIEST_START in call.data:
+            earliest_start = max(
+                earliest_start, local_naive(call.data[ATTR_EARLIEST_START], now)
+            )
+        finish_by = call.data.get(ATTR_FINISH_BY)
+        if finish_by is not None:
+            finish_by = local_naive(finish_by, earliest_start)
+
+        best = calcs.best_start(earliest_start, finish_by, call.data[ATTR_BLOCKED])
+        if best is None:
+            return {"start_time": None, "finish_time": None, "price": None}
+
+        start_time, price = best
+        finish_time = start_time + timedelta(seconds=calcs.duration_in_seconds)
+        return {
+            "start_time": local_isoformat(start_time),
+            "finish_time": local_isoformat(finish_time),
+            "price": price,
+        }
+
+    async def plan_interruptible_service(call: ServiceCall) -> ServiceResponse:
+        """Return cheapest price slots of an appliance that can be paused."""
+        from .optimizer import plan_interruptible
+
+        coordinator = coordinator_of_entity(hass, call.data[ATTR_ENTITY_ID])
+        series = coordinator.prices
+
+        # slots already started are not planned
+        now = dt_util.now().replace(tzinfo=None)
+        earliest_start = next_slot_start(series.start_time, series.resolution, now)
+        if ATTR_EARLIEST_START in call.data:
+            earliest_start = max(
+                earliest_start, local_naive(call.data[ATTR_EARLIEST_START], now)
+            )
+        finish_by = call.data.get(ATTR_FINISH_BY)
+        if finish_by is not None:
+            finish_by = local_naive(finish_by, earliest_start)
+
+        schedule = await hass.async_add_executor_job(
+            plan_interruptible,
+            coordinator.calc.appliance_file,
+            series.prices,
+            series.start_time,
+            series.resolution,
+            call.data.get(ATTR_ENERGY),
+            call.data.get(ATTR_POWER),
+            call.data[ATTR_MIN_SEGMENT] * 60,
+            earliest_start,
+            finish_by,
+            call.data[ATTR_BLOCKED],
+        )
+        if schedule is None:
+            return {"cost": None, "energy": None, "segments": []}
+
+        return {
+            "cost": schedule.cost,
+            "energy": float(schedule.energy.sum()),
+            "segments": [
+                {
+                    "start_time": local_isoformat(series.idx_to_dt(first)),
+                    "end_time": local_isoformat(series.idx_to_dt(end)),
+                    "energy": energy,
+                    "cost": cost,
+                }
+                for first, end, energy, cost in schedule.segments()
+            ],
+        }
+
+    async def plan_household_service(call: ServiceCall) -> ServiceResponse:
+        """Plan start times of several appliances within a power limit."""
+        from .household import grid_resolution, plan_household
+
+        if ATTR_ENTITY_ID in call.data:
+            coordinators = {
+                entity_id: coordinator_of_entity(hass, entity_id)
+                for entity_id in call.data[ATTR_ENTITY_ID]
+            }
+        else:
+            coordinators = coordinators_of_household(hass)
+        # an appliance is only planned once against the power limit
+        coordinators = unique_coordinators(coordinators)
+        if not coordinators:
+            raise HomeAssistantError("No price calc sensors to plan")
+
+        # appliances are placed on one grid of the same prices
+        hubs = {coordinator.hub for coordinator in coordinators.values()}
+        if len(hubs) > 1:
+            raise HomeAssistantError("Appliances must share the same price sensor")
+        series = hubs.pop().prices
+        grid_seconds = grid_resolution(series.resolution)
+
+        passed = (dt_util.now().replace(tzinfo=None) - series.start_time).total_seconds()
+        first_slot = max(int(-(-passed // grid_seconds)), 0)
+
+        planned = await hass.async_add_executor_job(
+            plan_household,
+            {
+                entity_id: coordinator.calc.appliance_file
+                for entity_id, coordinator in coordinators.items()
+            },
+            series.prices,
+            call.data[ATTR_POWER_LIMIT],
+            first_slot,
+            series.resolution,
+        )
+
+        response = {}
+        for entity_id, coordinator in coordinators.items():
+            if planned[entity_id] is None:
+                response[entity_id] = {"start_time": None, "price": None}
+                continue
+            slot, price = planned[entity_id]
+            planned_start = series.start_time + timedelta(seconds=slot * grid_seconds)
+            coordinator.async_set_household_start(planned_start, price)
+            response[entity_id] = {
+                "start_time": local_isoformat(planned_start),
+                "price": price,
+            }
+        return response
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_IMPORT_PROFILES, import_profiles, schema=IMPORT_PROFILES_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BEST_START,
+        best_start,
+        schema=BEST_START_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PLAN_INTERRUPTIBLE,
+        plan_interruptible_service,
+        schema=PLAN_INTERRUPTIBLE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PLAN_HOUSEHOLD,
+        plan_household_service,
+        schema=PLAN_HOUSEHOLD_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
@@ -0,0 +1 @@
+"""Tests for Price calc."""
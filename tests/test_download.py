@@ -0,0 +1,129 @@
+"""Tests of downloading appliance profiles."""
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+
+from custom_components.price_calc.download import (
+    DOWNLOADS_FILE,
+    DownloadError,
+    ProfileDownloader,
+)
+from custom_components.price_calc.library import ProfileLibrary
+
+PROFILE = {
+    "appliance_type": "dishwasher",
+    "appliance_manufactor": "acme",
+    "appliance_model": "dw1",
+    "appliance_mode": "eco",
+    "measure_method": "test",
+    "duration_in_minutes": 3,
+    "energy_use_resolution_in_seconds": 60,
+    "energy_usage": [0.1, 0.2, 0.3],
+}
+ETAG = '"profile-1"'
+
+
+@pytest.fixture
+async def server(socket_enabled):
+    """Serve a profile with an ETag, a large body, a slow response and a bad name."""
+    requests = []
+    body = json.dumps(PROFILE).encode("utf-8")
+
+    async def profile(request: web.Request) -> web.Response:
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == ETAG:
+            return web.Response(status=304)
+        return web.Response(body=body, headers={"ETag": ETAG})
+
+    async def large(request: web.Request) -> web.StreamResponse:
+        # streamed without Content-Length, so the limit is checked while reading
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        for _ in range(8):
+            await resp.write(b" " * 1024)
+        await resp.write_eof()
+        return resp
+
+    async def slow(request: web.Request) -> web.Response:
+        await asyncio.sleep(5)
+        return web.Response(body=body)
+
+    async def escape(request: web.Request) -> web.Response:
+        return web.json_response({**PROFILE, "appliance_manufactor": "../../config/Acme"})
+
+    app = web.Application()
+    app.router.add_get("/profile.json", profile)
+    app.router.add_get("/large.json", large)
+    app.router.add_get("/slow.json", slow)
+    app.router.add_get("/escape.json", escape)
+    test_server = TestServer(app)
+    await test_server.start_server()
+    test_server.requests = requests
+    yield test_server
+    await test_server.close()
+
+
+@pytest.fixture
+async def session():
+    """Return client session closed after the test."""
+    async with aiohttp.ClientSession() as client_session:
+        yield client_session
+
+
+async def test_download_unchanged(hass, server, session, tmp_path, caplog) -> None:
+    """Test a repeated download is a conditional request reusing the file."""
+    library = ProfileLibrary(str(tmp_path))
+    downloader = ProfileDownloader(hass, session, library)
+    url = str(server.make_url("/profile.json"))
+
+    path = await downloader.async_download(url)
+    assert json.loads((tmp_path / "acme_dw1_eco.json").read_text()) == PROFILE
+    assert path == str(tmp_path / "acme_dw1_eco.json")
+
+    assert await downloader.async_download(url) == path
+    assert server.requests == [None, ETAG]
+
+    # validators of downloads are not read as a profile
+    assert (tmp_path / DOWNLOADS_FILE).exists()
+    assert list(await hass.async_add_executor_job(library.scan, True)) == [
+        "acme_dw1_eco.json"
+    ]
+    assert "Skipping profile" not in caplog.text
+
+
+async def test_download_too_large(hass, server, session, tmp_path) -> None:
+    """Test a body larger than max_bytes is not stored."""
+    downloader = ProfileDownloader(
+        hass, session, ProfileLibrary(str(tmp_path)), max_bytes=4096
+    )
+
+    with pytest.raises(DownloadError, match="larger than 4096 bytes"):
+        await downloader.async_download(str(server.make_url("/large.json")))
+    assert not list(tmp_path.iterdir())
+
+
+async def test_download_timeout(hass, server, session, tmp_path) -> None:
+    """Test a response slower than the timeout fails the download."""
+    downloader = ProfileDownloader(
+        hass, session, ProfileLibrary(str(tmp_path)), timeout=0.1
+    )
+
+    with pytest.raises(DownloadError, match="timed out"):
+        await downloader.async_download(str(server.make_url("/slow.json")))
+    assert not list(tmp_path.iterdir())
+
+
+async def test_download_file_name_stays_in_data_dir(hass, server, session, tmp_path) -> None:
+    """Test path components in the profile do not escape the data dir."""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    downloader = ProfileDownloader(hass, session, ProfileLibrary(str(data_dir)))
+
+    path = await downloader.async_download(str(server.make_url("/escape.json")))
+
+    assert path == str(data_dir / "config_acme_dw1_eco.json")
+    assert sorted(item.name for item in tmp_path.iterdir()) == ["data"]
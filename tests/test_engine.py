@@ -0,0 +1,97 @@
+"""Tests of the window sum backends."""
+import numpy as np
+import pytest
+
+from custom_components.price_calc.engine import (
+    BACKEND_AUTO,
+    BACKEND_DIRECT,
+    BACKEND_FFT,
+    BACKEND_PIECEWISE,
+    BACKENDS,
+    FFT_MIN_PROFILE_LENGTH,
+    reference_window_sums,
+    select_backend,
+    verified_window_sums,
+    window_sums,
+)
+
+
+def reference(prices: np.ndarray, energy_usage: np.ndarray, step: int) -> np.ndarray:
+    """Return window sums of the original implementation, one row per profile."""
+    price_array = np.repeat(prices, step)
+    if energy_usage.ndim == 1:
+        return reference_window_sums(price_array, energy_usage)
+    return np.stack([reference_window_sums(price_array, row) for row in energy_usage])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("step", [1, 4, 60])
+@pytest.mark.parametrize("length", [1, 7, 64, 200])
+def test_backends_match_reference(backend: str, step: int, length: int) -> None:
+    """Test every backend against the original implementation for one profile."""
+    rng = np.random.default_rng(step * 1000 + length)
+    # every profile fits the prices with a day of start times to spare
+    prices = rng.uniform(-0.5, 3, -(-length // step) + 24)
+    energy_usage = rng.uniform(0, 2, length)
+
+    summed_prices = window_sums(prices, energy_usage, step, backend)
+
+    np.testing.assert_allclose(
+        summed_prices, reference(prices, energy_usage, step), rtol=1e-9, atol=1e-9
+    )
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("step", [1, 15])
+@pytest.mark.parametrize("length", [3, 90])
+def test_stacked_backends_match_reference(backend: str, step: int, length: int) -> None:
+    """Test every backend sums stacked profiles like one at a time."""
+    rng = np.random.default_rng(step * 1000 + length)
+    prices = rng.uniform(0, 3, -(-length // step) + 24)
+    energy_usage = rng.uniform(0, 2, (5, length))
+
+    summed_prices = window_sums(prices, energy_usage, step, backend)
+
+    assert summed_prices.shape == (5, len(prices) * step - length + 1)
+    np.testing.assert_allclose(
+        summed_prices, reference(prices, energy_usage, step), rtol=1e-9, atol=1e-9
+    )
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_profile_longer_than_prices(backend: str) -> None:
+    """Test no start is returned when the profile does not fit the prices."""
+    assert window_sums(np.ones(2), np.ones(10), 4, backend).size == 0
+
+
+@pytest.mark.parametrize(
+    ("usage_length", "step", "expected"),
+    [
+        (FFT_MIN_PROFILE_LENGTH - 1, 1, BACKEND_DIRECT),
+        (FFT_MIN_PROFILE_LENGTH, 1, BACKEND_FFT),
+        (FFT_MIN_PROFILE_LENGTH, 60, BACKEND_PIECEWISE),
+        (3, 4, BACKEND_PIECEWISE),
+    ],
+)
+def test_select_backend(usage_length: int, step: int, expected: str) -> None:
+    """Test FFT is only picked for long profiles at the resolution of the prices."""
+    assert select_backend(BACKEND_AUTO, usage_length, step) == expected
+    assert select_backend(BACKEND_DIRECT, usage_length, step) == BACKEND_DIRECT
+
+
+def test_verified_window_sums_falls_back() -> None:
+    """Test sums deviating from the reference are recalculated by the direct backend."""
+    rng = np.random.default_rng(1)
+    prices = rng.uniform(0, 3, 24)
+    energy_usage = rng.uniform(0, 2, 90)
+    summed_prices = window_sums(prices, energy_usage, 15)
+
+    assert verified_window_sums(prices, energy_usage, 15, summed_prices) is summed_prices
+
+    broken = summed_prices.copy()
+    broken[3] += 1
+    np.testing.assert_allclose(
+        verified_window_sums(prices, energy_usage, 15, broken),
+        reference(prices, energy_usage, 15),
+        rtol=1e-9,
+    )